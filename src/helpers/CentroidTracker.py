@@ -0,0 +1,180 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.spatial.distance import cdist
+
+from helpers.ClusterHistory import ClusterHistory
+from helpers.DischargeMetrics import distinct_steps, path_metrics
+
+GATED_DISTANCE = 1e9
+
+
+class CentroidTracker:
+    """Link discharge centroids across frames into tracks and keep the finished ones
+    that travel far enough as seizures. Drawing is left to ClusterTracker.
+
+    Seeking back restores the tracks from the last max_frames frames recorded, with
+    a full snapshot every checkpoint_interval frames. Older frames are dropped a
+    block at a time; seeking before the oldest one kept restores nothing, clears the
+    history and carries the current tracks on from the new time.
+    """
+
+    def __init__(
+        self,
+        max_distance=20.0,
+        min_consecutive_frames=3,
+        sampling_rate=100,
+        min_seizure_length=0.5,
+        max_frames=20_000,
+        checkpoint_interval=64,
+    ):
+        self.clusters = []
+        self.max_distance = max_distance
+        self.min_consecutive_frames = min_consecutive_frames
+        self.sampling_rate = sampling_rate
+        self.min_seizure_length = min_seizure_length
+        self.current_time = 0
+        self.history = ClusterHistory(
+            checkpoint_interval=checkpoint_interval, max_frames=max_frames
+        )
+        self.seizures = []
+        self.last_seizure = None
+
+    def update(self, new_centroids, current_time):
+        if current_time < self.current_time:
+            self._restore_state(current_time)
+        else:
+            self._process_new_centroids(new_centroids, current_time)
+
+        self.history.record(self.clusters, current_time)
+
+        self._clean_up_clusters_and_store_seizures()
+
+    def _clean_up_clusters_and_store_seizures(self):
+        new_clusters = []
+        for cluster in self.clusters:
+            if cluster[-1][1] > 0 or len(cluster) < self.min_consecutive_frames:
+                new_clusters.append(cluster)
+            else:
+                self._check_and_store_seizure(cluster)
+
+        self.clusters = new_clusters
+
+    def _check_and_store_seizure(self, cluster):
+        valid_points_with_times = [
+            (point, time) for point, count, time in cluster if point is not None
+        ]
+        if len(valid_points_with_times) > 1:
+            # Remove consecutive duplicates while preserving order
+            keep = distinct_steps([point for point, _ in valid_points_with_times])
+            valid_points = [
+                point for (point, _), kept in zip(valid_points_with_times, keep) if kept
+            ]
+            timestamps = [
+                time for (_, time), kept in zip(valid_points_with_times, keep) if kept
+            ]
+
+            lengths, instant_speeds = path_metrics(
+                valid_points, timestamps, [len(valid_points)]
+            )
+            length_mm = lengths[0]
+            instant_speeds = instant_speeds.tolist()
+
+            if length_mm >= self.min_seizure_length:
+                start_time = timestamps[0]
+                end_time = timestamps[-1]
+                duration_s = end_time - start_time
+                avg_speed = length_mm / duration_s if duration_s > 0 else 0
+
+                seizure = {
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "duration": duration_s * 1000,
+                    "length": length_mm,
+                    "avg_speed": avg_speed,
+                    "points": valid_points,
+                    "timestamps": timestamps,
+                    "instant_speeds": instant_speeds,
+                    "start_point": valid_points[0],
+                    "end_point": valid_points[-1],
+                    "time_since_last_discharge": (
+                        (start_time - self.last_seizure["start_time"]) * 1000
+                        if self.last_seizure
+                        else 0
+                    ),
+                }
+                self.seizures.append(seizure)
+                self.last_seizure = seizure
+
+    def _restore_state(self, target_time):
+        restored = self.history.restore(target_time)
+        if restored is not None:
+            self.clusters, self.current_time = restored
+
+    def _process_new_centroids(self, new_centroids, current_time):
+        if len(new_centroids) == 0:
+            for cluster in self.clusters:
+                cluster.append((None, 0, current_time))
+        else:
+            if not self.clusters:
+                self.clusters = [
+                    [(centroid, 1, current_time)] for centroid in new_centroids
+                ]
+                return
+
+            # Only clusters seen last frame can continue; match them all at once
+            # with a gated minimum-distance assignment
+            tracked = [
+                i
+                for i, cluster in enumerate(self.clusters)
+                if cluster[-1][0] is not None
+            ]
+            new_points = np.asarray(new_centroids, dtype=float).reshape(-1, 2)
+            matches = {}
+            if tracked:
+                last_points = np.array(
+                    [self.clusters[i][-1][0] for i in tracked], dtype=float
+                )
+                distances = cdist(last_points, new_points)
+                gated = np.where(
+                    distances <= self.max_distance, distances, GATED_DISTANCE
+                )
+                rows, cols = linear_sum_assignment(gated)
+                keep = distances[rows, cols] <= self.max_distance
+                matches = dict(zip(np.asarray(tracked)[rows[keep]], cols[keep]))
+
+            for i, cluster in enumerate(self.clusters):
+                if i in matches:
+                    j = matches[i]
+                    cluster.append((new_centroids[j], cluster[-1][1] + 1, current_time))
+                else:
+                    cluster.append((None, 0, current_time))
+
+            matched_indices = set(matches.values())
+            for i, centroid in enumerate(new_centroids):
+                if i not in matched_indices:
+                    self.clusters.append([(centroid, 1, current_time)])
+
+        self.current_time = current_time
+
+    def _clean_up_clusters(self):
+        self.clusters = [
+            cluster
+            for cluster in self.clusters
+            if cluster[-1][1] > 0 or len(cluster) < self.min_consecutive_frames
+        ]
+
+    def get_consistent_clusters(self):
+        return [
+            cluster
+            for cluster in self.clusters
+            if len(cluster) >= self.min_consecutive_frames
+        ]
+
+    def get_seizures(self):
+        return self.seizures
+
+    def clear(self):
+        self.clusters.clear()
+        self.current_time = 0
+        self.history.clear()
+        self.seizures.clear()
@@ -0,0 +1,101 @@
+from bisect import bisect_right
+
+
+class ClusterHistory:
+    """Per-frame cluster states stored as checkpoints plus deltas of cluster lengths."""
+
+    def __init__(self, checkpoint_interval=64, max_frames=20_000):
+        self.checkpoint_interval = checkpoint_interval
+        self.max_frames = max(max_frames, checkpoint_interval)
+        self.clear()
+
+    def clear(self):
+        self.times = []
+        self.frames = []
+        self.last_state = {}
+        # Clusters only ever grow by appending, so a frame can refer to one
+        # by id and length instead of copying its entries
+        self.clusters_by_id = {}
+        self.ids_by_object = {}
+        self.next_id = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def cluster_id(self, cluster):
+        key = id(cluster)
+        if key not in self.ids_by_object:
+            self.ids_by_object[key] = self.next_id
+            self.clusters_by_id[self.next_id] = cluster
+            self.next_id += 1
+        return self.ids_by_object[key]
+
+    def record(self, clusters, time):
+        state = {self.cluster_id(cluster): len(cluster) for cluster in clusters}
+        if len(self.frames) % self.checkpoint_interval == 0:
+            self.frames.append(("checkpoint", state))
+        else:
+            changed = {
+                cluster_id: length
+                for cluster_id, length in state.items()
+                if self.last_state.get(cluster_id) != length
+            }
+            removed = tuple(
+                cluster_id for cluster_id in self.last_state if cluster_id not in state
+            )
+            self.frames.append(("delta", (changed, removed)))
+        self.times.append(time)
+        self.last_state = state
+
+        if len(self.frames) > self.max_frames:
+            self.evict_oldest_block()
+
+    def state_at(self, index):
+        start = index - index % self.checkpoint_interval
+        state = dict(self.frames[start][1])
+        for _, (changed, removed) in self.frames[start + 1 : index + 1]:
+            for cluster_id in removed:
+                del state[cluster_id]
+            state.update(changed)
+        return state
+
+    def restore(self, target_time):
+        """Roll back to the last frame at or before target_time.
+
+        Returns (clusters, time) for that frame, or None if no frame is that old.
+        Later frames are discarded. The clusters are copies, so changes made to
+        them afterwards never reach the recorded frames.
+        """
+        index = bisect_right(self.times, target_time) - 1
+        if index < 0:
+            self.clear()
+            return None
+
+        state = self.state_at(index)
+        del self.frames[index + 1 :]
+        del self.times[index + 1 :]
+        self.last_state = state
+
+        clusters = []
+        for cluster_id, length in state.items():
+            cluster = self.clusters_by_id[cluster_id]
+            # Lengths only grow over time, so no earlier frame needs the tail
+            del cluster[length:]
+            clusters.append(list(cluster))
+        return clusters, self.times[index]
+
+    def evict_oldest_block(self):
+        # Dropping a whole block keeps every remaining block led by a checkpoint
+        del self.frames[: self.checkpoint_interval]
+        del self.times[: self.checkpoint_interval]
+        self.release_unreferenced()
+
+    def release_unreferenced(self):
+        referenced = set(self.last_state)
+        for kind, payload in self.frames:
+            referenced.update(payload if kind == "checkpoint" else payload[0])
+
+        for cluster_id in list(self.clusters_by_id):
+            if cluster_id not in referenced:
+                cluster = self.clusters_by_id.pop(cluster_id)
+                del self.ids_by_object[id(cluster)]
@@ -33,6 +33,9 @@ GRAPH_DOWNSAMPLE = 5_000
 
 TOTAL_POINTS = 20_000
 
+RASTER_DENSITY_BINS = 2048
+RASTER_DENSITY_THRESHOLD = 0.05  # spikes per screen pixel before switching to the image
+
 CELL_SIZE = 60  # micrometers
 
 MAC = "darwin"
@@ -0,0 +1,103 @@
+import numpy as np
+
+CHUNK_BYTES = 32 * 1024 * 1024
+# Text is many times larger than the binary data, so CSV works in smaller blocks
+CSV_CHUNK_BYTES = 1024 * 1024
+# Anything larger is not worth putting on the clipboard; export it instead
+CLIPBOARD_MAX_ELEMENTS = 1_000_000
+
+
+def rows_per_block(dataset, chunk_bytes=CHUNK_BYTES):
+    """Rows along axis 0 that fit in chunk_bytes, rounded to whole HDF5 chunks."""
+    row_bytes = max(1, dataset.dtype.itemsize * int(np.prod(dataset.shape[1:])))
+    rows = max(1, chunk_bytes // row_bytes)
+    if dataset.chunks is not None and rows > dataset.chunks[0]:
+        rows -= rows % dataset.chunks[0]
+    return rows
+
+
+def row_blocks(dataset, chunk_bytes=CHUNK_BYTES):
+    """Yield (start, block) hyperslabs covering the dataset along its first axis."""
+    if dataset.shape == ():
+        yield 0, dataset[()]
+        return
+    step = rows_per_block(dataset, chunk_bytes)
+    for start in range(0, dataset.shape[0], step):
+        yield start, dataset[start : start + step]
+
+
+def csv_format(dtype):
+    """printf-style format for one value, or None if rows need format_rows."""
+    if dtype.kind in "iu":
+        return "%d"
+    if dtype.kind == "b":
+        return "%s"
+    if dtype.kind == "f" and dtype.itemsize == 8:
+        return "%r"
+    if dtype.kind == "f" and dtype.itemsize < 8:
+        # Enough digits to read the same value back
+        return f"%.{np.finfo(dtype).precision + 3}g"
+    return None
+
+
+def write_csv_block(f, block, value_format):
+    """Write a numeric block with one formatting call instead of one per value."""
+    rows = np.asarray(block).reshape(len(block), -1)
+    row_format = ",".join([value_format] * rows.shape[1])
+    f.write(("\n".join([row_format] * len(rows)) + "\n") % tuple(rows.ravel().tolist()))
+
+
+def format_rows(block):
+    """Text rows for a block of a plain or compound dataset."""
+    if block.dtype.names:
+        return [
+            ",".join(
+                str(value.tolist() if isinstance(value, np.ndarray) else value)
+                for value in row
+            )
+            for row in block
+        ]
+    rows = np.asarray(block).reshape(len(block), -1) if block.ndim else [[block]]
+    return [",".join(str(value) for value in row) for row in rows]
+
+
+def export_csv(dataset, path, chunk_bytes=CSV_CHUNK_BYTES, progress=None):
+    value_format = csv_format(dataset.dtype)
+    with open(path, "w", newline="") as f:
+        if dataset.dtype.names:
+            f.write(",".join(dataset.dtype.names) + "\n")
+        for start, block in row_blocks(dataset, chunk_bytes):
+            block = np.asarray(block)
+            if block.ndim == 0:
+                block = block.reshape(1)
+            if value_format is None:
+                f.write("\n".join(format_rows(block)) + "\n")
+            else:
+                write_csv_block(f, block, value_format)
+            if progress is not None:
+                progress(start + len(block))
+
+
+def export_npy(dataset, path, chunk_bytes=CHUNK_BYTES, progress=None):
+    output = np.lib.format.open_memmap(
+        path, mode="w+", dtype=dataset.dtype, shape=dataset.shape
+    )
+    try:
+        for start, block in row_blocks(dataset, chunk_bytes):
+            if dataset.shape == ():
+                output[()] = block
+                continue
+            output[start : start + len(block)] = block
+            if progress is not None:
+                progress(start + len(block))
+        output.flush()
+    finally:
+        del output
+
+
+def export_dataset(dataset, path, progress=None):
+    """Write a dataset to .npy or .csv (by suffix) without loading it whole."""
+    if str(path).lower().endswith(".npy"):
+        export_npy(dataset, path, progress=progress)
+    else:
+        export_csv(dataset, path, progress=progress)
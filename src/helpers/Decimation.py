@@ -0,0 +1,95 @@
+import numpy as np
+from scipy.signal import firwin, upfirdn
+
+# Filter half-length in output samples, the same default as scipy.signal.resample_poly
+HALF_LENGTH = 10
+
+
+def decimation_filter(factor, half_length=HALF_LENGTH):
+    """Kaiser-windowed low-pass FIR with its cutoff at the decimated Nyquist rate."""
+    if factor == 1:
+        return np.ones(1)
+    return firwin(2 * half_length * factor + 1, 1.0 / factor, window=("kaiser", 5.0))
+
+
+def decimate_range(x, factor, first, count, offset=0, taps=None):
+    """Filtered samples of x at positions first, first + factor, ... along the last axis.
+
+    x[..., 0] sits at position offset and the signal is taken as zero outside x.
+    The filter delay is compensated, so the result lines up with a plain stride.
+    """
+    if taps is None:
+        taps = decimation_filter(factor)
+    if count <= 0:
+        return x[..., :0]
+    if len(taps) == 1:
+        start = first - offset
+        return x[..., start : start + (count - 1) * factor + 1 : factor]
+
+    delay = (len(taps) - 1) // 2
+    lo = first - delay - offset
+    hi = first + (count - 1) * factor + delay + 1 - offset
+    segment = x[..., max(lo, 0) : max(hi, 0)]
+    left = max(lo, 0) - lo
+    right = hi - lo - left - segment.shape[-1]
+    segment = np.pad(segment, [(0, 0)] * (x.ndim - 1) + [(left, right)])
+    filtered = upfirdn(taps, segment, 1, factor, axis=-1)
+    skip = 2 * delay // factor
+    return filtered[..., skip : skip + count].astype(x.dtype, copy=False)
+
+
+def decimate(x, factor, taps=None):
+    """Anti-aliased decimation of a whole signal along its last axis."""
+    return decimate_range(x, factor, 0, -(-x.shape[-1] // factor), taps=taps)
+
+
+class PolyphaseDecimator:
+    """Anti-aliased decimation of a signal fed in consecutive blocks along the last axis.
+
+    Output sample m is the filtered input at position m * factor, as decimate would
+    give for the whole signal. The input still needed by the filter is kept
+    between blocks, so block boundaries leave no trace in the output.
+    """
+
+    def __init__(self, factor, start=0, half_length=HALF_LENGTH):
+        self.factor = factor
+        self.taps = decimation_filter(factor, half_length)
+        self.delay = (len(self.taps) - 1) // 2
+        self.buffer = None
+        self.buffer_start = start
+        self.position = start
+        self.next_output = -(-start // factor) * factor
+
+    def prime(self, history):
+        """Feed the samples just before start, used as filter history only."""
+        self.buffer = history
+        self.buffer_start = self.position - history.shape[-1]
+
+    def process(self, block):
+        """Feed the next block and return every output whose input is complete."""
+        if self.buffer is None:
+            self.buffer = block
+        else:
+            self.buffer = np.concatenate((self.buffer, block), axis=-1)
+        self.position += block.shape[-1]
+        return self.emit(self.position - self.delay)
+
+    def flush(self, stop=None):
+        """Return the outputs before stop, taking the signal as zero past its end."""
+        return self.emit(self.position if stop is None else stop)
+
+    def emit(self, stop):
+        count = max(0, -(-(stop - self.next_output) // self.factor))
+        output = decimate_range(
+            self.buffer,
+            self.factor,
+            self.next_output,
+            count,
+            self.buffer_start,
+            self.taps,
+        )
+        self.next_output += count * self.factor
+        keep = max(self.buffer_start, self.next_output - self.delay)
+        self.buffer = self.buffer[..., keep - self.buffer_start :]
+        self.buffer_start = keep
+        return output
@@ -0,0 +1,173 @@
+import io
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import h5py
+import numpy as np
+import pandas as pd
+from scipy.io import savemat
+
+from helpers.DischargeStore import SCALAR_FIELDS, read_discharges
+
+parquet_available = True
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    parquet_available = False
+
+OUTPUT_FORMATS = ("zip", "parquet")
+STATS_CATEGORIES = ("avg_speed", "instant_speed", "correlation", "other")
+
+
+def stats_categories(attrs):
+    """Group analysis_stats attributes the way the exported stats files are split."""
+    categories = {category: {} for category in STATS_CATEGORIES}
+    for key, value in attrs.items():
+        if key.startswith("avg_speed_"):
+            categories["avg_speed"][key.replace("avg_speed_", "")] = value
+        elif key.startswith("instant_speed_"):
+            categories["instant_speed"][key.replace("instant_speed_", "")] = value
+        elif "corr" in key:
+            categories["correlation"][key] = value
+        else:
+            categories["other"][key] = value
+    return {category: stats for category, stats in categories.items() if stats}
+
+
+def discharge_table(discharges):
+    """One row per discharge, keyed by discharge_id."""
+    return pd.DataFrame(
+        [
+            {"discharge_id": f"discharge_{i}", **discharge}
+            for i, discharge in enumerate(discharges)
+        ],
+        columns=["discharge_id", *SCALAR_FIELDS]
+        + ["points", "timestamps", "instant_speeds", "start_point", "end_point"],
+    )
+
+
+def time_series(discharge):
+    points = np.asarray(discharge["points"], dtype=float).reshape(-1, 2)
+    return {
+        "timestamp": np.asarray(discharge["timestamps"], dtype=float),
+        "instant_speed": np.asarray(discharge["instant_speeds"], dtype=float),
+        "point_x": points[:, 0],
+        "point_y": points[:, 1],
+    }
+
+
+def write_mat(zf, name, data):
+    # savemat needs a seekable file, so MAT entries are built one at a time
+    buffer = io.BytesIO()
+    savemat(buffer, data, do_compression=True)
+    zf.writestr(name, buffer.getvalue())
+
+
+def write_csv(zf, name, df, **kwargs):
+    with zf.open(name, "w") as entry, io.TextIOWrapper(
+        entry, encoding="utf-8", newline=""
+    ) as text:
+        df.to_csv(text, **kwargs)
+
+
+def export_zip(path, categories, discharges):
+    with zipfile.ZipFile(path, "w") as zf:
+        for category, stats in categories.items():
+            df = pd.DataFrame([stats]).T
+            df.columns = ["value"]
+            write_csv(zf, f"{category}_stats.csv", df)
+            write_mat(zf, f"{category}_stats.mat", stats)
+
+        if not discharges:
+            return
+        table = discharge_table(discharges)
+        write_csv(zf, "all_discharges.csv", table, index=False)
+        write_mat(
+            zf,
+            "all_discharges.mat",
+            {row["discharge_id"]: np.array([row]) for row in table.to_dict("records")},
+        )
+
+        # Each discharge's series goes straight into its own entry, so only one
+        # discharge is held in memory as a table at a time
+        for discharge_id, discharge in zip(table["discharge_id"], discharges):
+            series = time_series(discharge)
+            write_csv(
+                zf,
+                f"discharge_{discharge_id}_timeseries.csv",
+                pd.DataFrame(series),
+                index=False,
+            )
+            write_mat(zf, f"discharge_{discharge_id}_timeseries.mat", series)
+
+
+def export_parquet(path, categories, discharges):
+    path.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(
+        [
+            {"category": category, "statistic": key, "value": float(value)}
+            for category, stats in categories.items()
+            for key, value in stats.items()
+        ],
+        columns=["category", "statistic", "value"],
+    ).to_parquet(path / "stats.parquet", index=False)
+
+    table = discharge_table(discharges)
+    table.to_parquet(path / "all_discharges.parquet", index=False)
+
+    # Long format: one row per tracked point, for joining on discharge_id
+    series = [time_series(discharge) for discharge in discharges]
+    counts = [len(s["timestamp"]) for s in series]
+    pd.DataFrame(
+        {
+            "discharge_id": np.repeat(table["discharge_id"].to_numpy(), counts),
+            **{
+                column: np.concatenate([s[column] for s in series] + [np.empty(0)])
+                for column in ("timestamp", "instant_speed", "point_x", "point_y")
+            },
+        }
+    ).to_parquet(path / "timeseries.parquet", index=False)
+
+
+def export_timeframe(hdf5_path, timeframe_name, output_dir, output_format="zip"):
+    """Export one tracked_discharges timeframe; returns the path written."""
+    with h5py.File(hdf5_path, "r") as f:
+        timeframe_group = f["tracked_discharges"][timeframe_name]
+        categories = (
+            stats_categories(timeframe_group["analysis_stats"].attrs)
+            if "analysis_stats" in timeframe_group
+            else {}
+        )
+        discharges = read_discharges(timeframe_group)
+
+    output_dir = Path(output_dir)
+    if output_format == "parquet":
+        path = output_dir / f"discharges_{timeframe_name}"
+        export_parquet(path, categories, discharges)
+    else:
+        path = output_dir / f"discharges_{timeframe_name}.zip"
+        export_zip(path, categories, discharges)
+    return path
+
+
+def export_discharges(hdf5_path, output_dir, output_format="zip", max_workers=None):
+    """Export every tracked timeframe in an HDF5 file, several timeframes at once."""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown export format: {output_format}")
+    if output_format == "parquet" and not parquet_available:
+        raise ValueError("Parquet export requires pyarrow to be installed")
+
+    with h5py.File(hdf5_path, "r") as f:
+        if "tracked_discharges" not in f:
+            raise ValueError("No tracked discharges found in HDF5 file")
+        timeframes = list(f["tracked_discharges"].keys())
+
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    args = [(hdf5_path, name, output_dir, output_format) for name in timeframes]
+    max_workers = min(len(timeframes), max_workers or os.cpu_count() or 1)
+    if max_workers <= 1:
+        return [export_timeframe(*arg) for arg in args]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(export_timeframe, *zip(*args)))
@@ -0,0 +1,37 @@
+import numpy as np
+
+
+class DischargeIndex:
+    """All discharge times of the active channels in one sorted array, for lookups by time."""
+
+    def __init__(self, discharges, active_channels):
+        self.discharges = discharges
+        self.active_channels = active_channels
+        self.cells = np.asarray(active_channels, dtype=int).reshape(-1, 2)
+        times = []
+        channels = []
+        for i, (row, col) in enumerate(active_channels):
+            if (row - 1, col - 1) not in discharges:
+                continue
+            discharge_times = np.asarray(discharges[(row - 1, col - 1)][0], dtype=float)
+            times.append(discharge_times.ravel())
+            channels.append(np.full(discharge_times.size, i))
+
+        times = np.concatenate(times + [np.empty(0)])
+        channels = np.concatenate(channels + [np.empty(0, dtype=int)])
+        order = np.argsort(times, kind="stable")
+        self.times = times[order]
+        self.channels = channels[order]
+
+    def channels_near(self, time, bin_size, start=-np.inf, stop=np.inf):
+        """Indices into active_channels with a discharge within bin_size of time,
+        restricted to discharges in [start, stop], in active_channels order."""
+        first = np.searchsorted(self.times, time - bin_size, side="right")
+        last = np.searchsorted(self.times, time + bin_size, side="left")
+        times = self.times[first:last]
+        in_range = (times >= start) & (times <= stop)
+        return np.unique(self.channels[first:last][in_range])
+
+    def cells_near(self, time, bin_size, start=-np.inf, stop=np.inf):
+        """1-based (row, col) cells with a discharge within bin_size of time."""
+        return self.cells[self.channels_near(time, bin_size, start, stop)]
@@ -0,0 +1,89 @@
+import numpy as np
+from scipy import stats
+
+from helpers.Constants import CELL_SIZE
+
+
+def distinct_steps(points):
+    """Mask keeping the first point of every run of repeated consecutive points."""
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    return np.concatenate(([True], np.any(np.diff(points, axis=0) != 0, axis=1)))[
+        : len(points)
+    ]
+
+
+def path_metrics(points, timestamps, counts):
+    """Path length in mm per discharge and instantaneous speed in mm/s per point.
+
+    Discharges are laid end to end in points and timestamps, counts giving the
+    number of points in each. The last point of a discharge repeats the speed
+    of the step before it, or 0 for a single point.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    timestamps = np.asarray(timestamps, dtype=float)
+    counts = np.asarray(counts, dtype=np.int64)
+    ends = np.cumsum(counts)
+
+    step_lengths = np.linalg.norm(np.diff(points, axis=0), axis=1)
+    time_diffs = np.diff(timestamps)
+    # Steps from the last point of one discharge to the first of the next
+    within = np.ones(len(step_lengths), dtype=bool)
+    within[ends[(counts > 0) & (ends < len(points))] - 1] = False
+
+    speeds = np.zeros(len(points))
+    positive = time_diffs > 0
+    speeds[:-1][positive] = (
+        step_lengths[positive] * CELL_SIZE / 1000 / time_diffs[positive]
+    )
+    last = ends[counts > 0] - 1
+    speeds[last] = np.where(counts[counts > 0] > 1, speeds[last - 1], 0)
+
+    discharge_of_step = np.repeat(np.arange(len(counts)), counts)[:-1]
+    lengths = np.bincount(
+        discharge_of_step[within], weights=step_lengths[within], minlength=len(counts)
+    )
+    return lengths * CELL_SIZE / 1000, speeds
+
+
+def intervals_since_previous(start_times):
+    """Milliseconds from each discharge start to the previous one, 0 for the first."""
+    start_times = np.asarray(start_times, dtype=float)
+    return np.concatenate(([0.0], np.diff(start_times) * 1000))[: len(start_times)]
+
+
+def summary_statistics(values):
+    return {
+        "mean": np.mean(values),
+        "median": np.median(values),
+        "std": np.std(values),
+        "min": np.min(values),
+        "max": np.max(values),
+        "q1": np.percentile(values, 25),
+        "q3": np.percentile(values, 75),
+        "iqr": stats.iqr(values),
+        "skewness": stats.skew(values),
+        "kurtosis": stats.kurtosis(values),
+    }
+
+
+def speed_statistics(columns):
+    """Summary of the speed columns read by DischargeStore.read_discharge_columns."""
+    avg_speeds = columns["avg_speed"]
+    durations = columns["duration"]
+    lengths = columns["length"]
+    time_between_discharges = columns["time_since_last_discharge"]
+    return {
+        "avg_speed_stats": summary_statistics(avg_speeds),
+        "instant_speed_stats": summary_statistics(columns["instant_speeds"]),
+        "correlation_stats": {
+            "speed_duration_corr": np.corrcoef(avg_speeds, durations)[0, 1],
+            "speed_length_corr": np.corrcoef(avg_speeds, lengths)[0, 1],
+            "speed_time_between_corr": np.corrcoef(
+                avg_speeds[1:], time_between_discharges[1:]
+            )[0, 1],
+        },
+        "total_discharges": len(avg_speeds),
+        "avg_duration": np.mean(durations),
+        "avg_length": np.mean(lengths),
+        "avg_time_between_discharges": np.mean(time_between_discharges[1:]),
+    }
@@ -0,0 +1,179 @@
+from uuid import uuid4
+
+import numpy as np
+
+# Version 1 stored each area as a dummy dataset named by its id with attributes
+FORMAT_VERSION = 2
+TABLE_KEYS = ("areas", "involved_channels")
+AREA_DTYPE = np.dtype(
+    [
+        ("id", "S36"),
+        ("timestamp", "f8"),
+        ("centroid_x", "f8"),
+        ("centroid_y", "f8"),
+        ("width", "f8"),
+        ("height", "f8"),
+        ("channel_offset", "i8"),
+        ("channel_count", "i8"),
+    ]
+)
+
+
+class DischargeStartAreas:
+    """Discharge start areas held as one table, with timestamps indexed for binning."""
+
+    def __init__(self, table=None, channels=None):
+        self.table = np.zeros(0, dtype=AREA_DTYPE) if table is None else table
+        self.channels = (
+            np.zeros((0, 2), dtype=np.int64)
+            if channels is None
+            else np.asarray(channels, dtype=np.int64).reshape(-1, 2)
+        )
+        self.reindex()
+
+    def __len__(self):
+        return len(self.table)
+
+    def reindex(self):
+        self.order = np.argsort(self.table["timestamp"], kind="stable")
+        self.sorted_times = self.table["timestamp"][self.order]
+
+    def clear(self):
+        self.__init__()
+
+    def append(self, timestamp, x, y, width, height, involved_channels):
+        channels = np.asarray(involved_channels, dtype=np.int64).reshape(-1, 2)
+        row = np.zeros(1, dtype=AREA_DTYPE)
+        row["id"] = str(uuid4())
+        row["timestamp"] = timestamp
+        row["centroid_x"] = x
+        row["centroid_y"] = y
+        row["width"] = width
+        row["height"] = height
+        row["channel_offset"] = len(self.channels)
+        row["channel_count"] = len(channels)
+        self.table = np.concatenate((self.table, row))
+        self.channels = np.concatenate((self.channels, channels))
+        self.reindex()
+
+    def involved_channels(self, index):
+        row = self.table[index]
+        start = row["channel_offset"]
+        return self.channels[start : start + row["channel_count"]]
+
+    def indices_between(self, start_time, end_time):
+        """Indices of areas with start_time <= timestamp < end_time, in insertion order."""
+        first, last = np.searchsorted(self.sorted_times, [start_time, end_time])
+        return np.sort(self.order[first:last])
+
+    def bin_counts(self, num_bins, bin_size):
+        """Areas per [i * bin_size, (i + 1) * bin_size) bin."""
+        edges = np.arange(num_bins + 1) * bin_size
+        return np.diff(np.searchsorted(self.sorted_times, edges, side="left"))
+
+    def select(self, indices):
+        table = self.table[np.arange(len(self))[indices]]
+        counts = table["channel_count"]
+        offsets = np.cumsum(counts) - counts
+        channel_index = np.repeat(
+            table["channel_offset"] - offsets, counts
+        ) + np.arange(counts.sum())
+        table["channel_offset"] = offsets
+        return DischargeStartAreas(table, self.channels[channel_index])
+
+    def write_hdf5(self, group):
+        """Append the areas group does not hold yet, upgrading its layout if needed."""
+        DischargeStartAreas.prepare_hdf5(group)
+        areas = group["areas"]
+        channels = group["involved_channels"]
+        stored_ids = areas["id"] if len(areas) else np.zeros(0, dtype="S36")
+        new = self.select(~np.isin(self.table["id"], stored_ids))
+        if len(new) == 0:
+            return
+
+        table = new.table.copy()
+        table["channel_offset"] += len(channels)
+        # Channels go first, so an interrupted append never leaves an area
+        # pointing past the end of involved_channels
+        channels.resize(len(channels) + len(new.channels), axis=0)
+        channels[len(channels) - len(new.channels) :] = new.channels
+        areas.resize(len(areas) + len(table), axis=0)
+        areas[len(areas) - len(table) :] = table
+
+    @staticmethod
+    def create_tables(group, areas, suffix=""):
+        group.create_dataset(
+            "areas" + suffix, data=areas.table, maxshape=(None,), chunks=(256,)
+        )
+        group.create_dataset(
+            "involved_channels" + suffix,
+            data=areas.channels,
+            maxshape=(None, 2),
+            chunks=(256, 2),
+        )
+
+    @classmethod
+    def prepare_hdf5(cls, group):
+        """Give group resizable version 2 tables, keeping every area it holds."""
+        if int(group.attrs.get("format_version", 1)) < FORMAT_VERSION:
+            stored, parsed = cls.read_legacy_hdf5(group)
+            # Tables left by an interrupted upgrade; the old entries are all still there
+            for key in TABLE_KEYS:
+                if key in group:
+                    del group[key]
+            cls.create_tables(group, stored)
+            group.attrs["format_version"] = FORMAT_VERSION
+            # Entries that could not be read are left where they are
+            for key in parsed:
+                del group[key]
+        elif group["areas"].maxshape[0] is not None:
+            # Written before the tables were resizable; swap in copies that are
+            stored = cls.read_hdf5(group)
+            cls.create_tables(group, stored, suffix="_resizable")
+            for key in TABLE_KEYS:
+                del group[key]
+                group.move(f"{key}_resizable", key)
+
+    @classmethod
+    def read_hdf5(cls, group):
+        if int(group.attrs.get("format_version", 1)) >= FORMAT_VERSION:
+            return cls(group["areas"][()], group["involved_channels"][()])
+        return cls.read_legacy_hdf5(group)[0]
+
+    @classmethod
+    def read_legacy_hdf5(cls, group):
+        """Areas stored one dataset per area, and the keys that were read."""
+        rows = []
+        channels = []
+        parsed = []
+        offset = 0
+        for area_id in group:
+            if area_id in TABLE_KEYS:
+                continue
+            try:
+                attrs = group[area_id].attrs
+                area_channels = np.asarray(attrs["involved_channels"]).reshape(-1, 2)
+                rows.append(
+                    (
+                        area_id,
+                        attrs["timestamp"],
+                        attrs["centroid_x"],
+                        attrs["centroid_y"],
+                        attrs["width"],
+                        attrs["height"],
+                        offset,
+                        len(area_channels),
+                    )
+                )
+                channels.append(area_channels)
+                parsed.append(area_id)
+                offset += len(area_channels)
+            except Exception as e:
+                print(f"Error loading discharge start area: {e}")
+                continue
+        if not rows:
+            return cls(), parsed
+        return (
+            cls(np.array(rows, dtype=AREA_DTYPE), np.concatenate(channels)),
+            parsed,
+        )
@@ -0,0 +1,144 @@
+import numpy as np
+
+from helpers.DischargeMetrics import path_metrics
+
+# Version 1 stored each discharge as a dummy dataset carrying attributes.
+# Version 2 stores one table of scalar fields plus ragged per-point columns.
+FORMAT_VERSION = 2
+SCALAR_FIELDS = (
+    "start_time",
+    "end_time",
+    "duration",
+    "length",
+    "avg_speed",
+    "time_since_last_discharge",
+)
+COLUMNAR_DATASETS = ("discharges", "points", "timestamps", "instant_speeds")
+
+DISCHARGE_DTYPE = np.dtype(
+    [(field, "f8") for field in SCALAR_FIELDS]
+    + [
+        ("start_point", "f8", (2,)),
+        ("end_point", "f8", (2,)),
+        ("offset", "i8"),
+        ("count", "i8"),
+    ]
+)
+
+
+def is_columnar(group):
+    return int(group.attrs.get("format_version", 1)) >= FORMAT_VERSION
+
+
+def write_discharges(group, seizures):
+    """Replace the discharges stored in a timeframe group with one bulk write per column."""
+    for key in list(group.keys()):
+        if key.startswith("discharge_") or key in COLUMNAR_DATASETS:
+            del group[key]
+
+    counts = np.array([len(seizure["points"]) for seizure in seizures], dtype=np.int64)
+    table = np.zeros(len(seizures), dtype=DISCHARGE_DTYPE)
+    for field in SCALAR_FIELDS:
+        table[field] = [seizure[field] for seizure in seizures]
+    table["start_point"] = np.reshape(
+        [seizure["start_point"] for seizure in seizures], (-1, 2)
+    )
+    table["end_point"] = np.reshape(
+        [seizure["end_point"] for seizure in seizures], (-1, 2)
+    )
+    table["count"] = counts
+    table["offset"] = np.cumsum(counts) - counts
+
+    def column(key, shape):
+        # Discharges converted from old files may lack per-point series
+        return np.concatenate(
+            [
+                (
+                    np.reshape(seizure[key], shape)
+                    if key in seizure
+                    else np.full((count,) + shape[1:], np.nan)
+                )
+                for seizure, count in zip(seizures, counts)
+            ]
+            + [np.empty((0,) + shape[1:])]
+        )
+
+    group.create_dataset("discharges", data=table)
+    group.create_dataset("points", data=column("points", (-1, 2)))
+    group.create_dataset("timestamps", data=column("timestamps", (-1,)))
+    group.create_dataset("instant_speeds", data=column("instant_speeds", (-1,)))
+    group.attrs["format_version"] = FORMAT_VERSION
+
+
+def read_discharge_columns(group):
+    """Scalar fields as arrays plus the flattened instantaneous speeds of all discharges."""
+    if not is_columnar(group):
+        seizures = read_legacy_discharges(group)
+        columns = {
+            field: np.array([seizure[field] for seizure in seizures], dtype=float)
+            for field in SCALAR_FIELDS
+        }
+        columns["instant_speeds"] = np.array(
+            [speed for seizure in seizures for speed in seizure["instant_speeds"]],
+            dtype=float,
+        )
+        return columns
+
+    table = group["discharges"][()]
+    columns = {field: table[field] for field in SCALAR_FIELDS}
+    columns["instant_speeds"] = group["instant_speeds"][()]
+    return columns
+
+
+def read_discharges(group):
+    """All discharges in a timeframe group as the dicts ClusterTracker produces."""
+    if not is_columnar(group):
+        return read_legacy_discharges(group)
+
+    table = group["discharges"][()]
+    points = group["points"][()]
+    timestamps = group["timestamps"][()]
+    instant_speeds = group["instant_speeds"][()]
+
+    seizures = []
+    for row in table:
+        span = slice(row["offset"], row["offset"] + row["count"])
+        seizure = {field: float(row[field]) for field in SCALAR_FIELDS}
+        seizure.update(
+            {
+                "points": points[span].tolist(),
+                "timestamps": timestamps[span].tolist(),
+                "instant_speeds": instant_speeds[span].tolist(),
+                "start_point": row["start_point"].tolist(),
+                "end_point": row["end_point"].tolist(),
+            }
+        )
+        seizures.append(seizure)
+    return seizures
+
+
+def read_legacy_discharges(group):
+    seizures = []
+    for key in group.keys():
+        if not key.startswith("discharge_"):
+            continue
+        attrs = group[key].attrs
+        points = np.asarray(attrs["points"], dtype=float).reshape(-1, 2)
+        timestamps = np.asarray(attrs["timestamps"], dtype=float)
+        if "instant_speeds" in attrs:
+            instant_speeds = np.asarray(attrs["instant_speeds"], dtype=float)
+        else:
+            _, instant_speeds = path_metrics(points, timestamps, [len(points)])
+
+        seizure = {field: float(attrs[field]) for field in SCALAR_FIELDS}
+        seizure.update(
+            {
+                "points": points.tolist(),
+                "timestamps": timestamps.tolist(),
+                "instant_speeds": instant_speeds.tolist(),
+                "start_point": np.asarray(attrs["start_point"]).tolist(),
+                "end_point": np.asarray(attrs["end_point"]).tolist(),
+            }
+        )
+        seizures.append(seizure)
+    return seizures
@@ -0,0 +1,166 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from helpers.CentroidTracker import CentroidTracker
+from helpers.DischargeMetrics import intervals_since_previous
+from helpers.LatticeDBSCAN import lattice_centroids
+
+WINDOW_BEFORE = 0.1  # seconds tracked before each discharge
+WINDOW_AFTER = 0.15  # seconds tracked after each discharge
+
+
+def discharged_mask(frame_times, discharge_times, bin_size):
+    """(frames, channels) mask of channels with a discharge within bin_size of each frame."""
+    mask = np.zeros((len(frame_times) + 1, len(discharge_times)), dtype=np.int32)
+    for channel, times in enumerate(discharge_times):
+        if len(times) == 0:
+            continue
+        first = np.searchsorted(frame_times, times - bin_size, side="right")
+        last = np.searchsorted(frame_times, times + bin_size, side="left")
+        np.add.at(mask[:, channel], first, 1)
+        np.add.at(mask[:, channel], last, -1)
+    return np.cumsum(mask[:-1], axis=0) > 0
+
+
+def track_discharge_window(
+    frame_times,
+    cells,
+    discharge_times,
+    bin_size,
+    eps,
+    min_samples,
+    max_distance,
+    min_consecutive_frames,
+    min_seizure_length,
+):
+    """Run the propagation tracker over one discharge window without drawing anything.
+
+    Mirrors stepping the playhead through the window with prop lines enabled:
+    each frame clusters the cells discharging near that time and feeds the
+    centroids to a fresh CentroidTracker.
+    """
+    tracker = CentroidTracker(
+        max_distance=max_distance,
+        min_consecutive_frames=min_consecutive_frames,
+        min_seizure_length=min_seizure_length,
+    )
+    mask = discharged_mask(frame_times, discharge_times, bin_size)
+
+    # The discharged set only changes at a few frames, so cluster once per run
+    # and do all runs in one batch
+    changes = np.flatnonzero(np.any(mask[1:] != mask[:-1], axis=1)) + 1
+    starts = np.concatenate(([0], changes))
+    stops = np.concatenate((changes, [len(frame_times)]))
+    run_centroids = lattice_centroids(
+        [cells[mask[run_start]] for run_start in starts], eps, min_samples
+    )
+    for run_start, run_stop, centroids in zip(starts, stops, run_centroids):
+        for time in frame_times[run_start:run_stop]:
+            tracker.update(centroids, time)
+
+    # Close any track still open at the end of the window
+    if len(frame_times) > 0:
+        tracker.update([], frame_times[-1] + bin_size)
+    return tracker.seizures
+
+
+class DischargeTracker:
+    """Track discharge propagation for many discharges in parallel worker processes."""
+
+    def __init__(
+        self,
+        active_channels,
+        discharges,
+        sampling_rate,
+        num_samples,
+        bin_size,
+        eps,
+        min_samples,
+        max_distance=20.0,
+        min_consecutive_frames=3,
+        min_seizure_length=0.5,
+        max_workers=None,
+    ):
+        self.cells = np.asarray(active_channels, dtype=float).reshape(-1, 2)
+        self.channel_discharges = [
+            (
+                np.asarray(discharges[(row - 1, col - 1)][0], dtype=float)
+                if (row - 1, col - 1) in discharges
+                else np.empty(0)
+            )
+            for row, col in active_channels
+        ]
+        self.sampling_rate = sampling_rate
+        self.num_samples = num_samples
+        self.bin_size = bin_size
+        self.eps = eps
+        self.min_samples = min_samples
+        self.max_distance = max_distance
+        self.min_consecutive_frames = min_consecutive_frames
+        self.min_seizure_length = min_seizure_length
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def window_args(self, discharge_time, start, stop):
+        discharge_index = int(discharge_time * self.sampling_rate)
+        start_index = max(0, discharge_index - int(WINDOW_BEFORE * self.sampling_rate))
+        end_index = min(
+            self.num_samples - 1,
+            discharge_index + int(WINDOW_AFTER * self.sampling_rate),
+        )
+        frame_times = np.arange(start_index, end_index + 1) / self.sampling_rate
+
+        # Only ship the discharge times that can light up a frame in this window
+        low = max(start, frame_times[0] - self.bin_size)
+        high = min(stop, frame_times[-1] + self.bin_size)
+        discharge_times = [
+            times[(times >= low) & (times <= high)] for times in self.channel_discharges
+        ]
+        return (
+            frame_times,
+            self.cells,
+            discharge_times,
+            self.bin_size,
+            self.eps,
+            self.min_samples,
+            self.max_distance,
+            self.min_consecutive_frames,
+            self.min_seizure_length,
+        )
+
+    def track(self, discharge_times, start, stop, progress=None, is_canceled=None):
+        """Return the tracked discharges for every discharge time, ordered by start time.
+
+        Returns None if is_canceled() becomes true before all windows finish.
+        """
+        results = [None] * len(discharge_times)
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                pool.submit(
+                    track_discharge_window, *self.window_args(time, start, stop)
+                ): i
+                for i, time in enumerate(discharge_times)
+            }
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                if is_canceled is not None and is_canceled():
+                    for future in pending:
+                        future.cancel()
+                    return None
+                for future in done:
+                    results[futures[future]] = future.result()
+                if done and progress is not None:
+                    progress(len(futures) - len(pending), len(futures))
+
+        seizures = sorted(
+            (seizure for window in results for seizure in window),
+            key=lambda seizure: seizure["start_time"],
+        )
+        intervals = intervals_since_previous(
+            [seizure["start_time"] for seizure in seizures]
+        )
+        for seizure, interval in zip(seizures, intervals):
+            seizure["time_since_last_discharge"] = float(interval)
+        return seizures
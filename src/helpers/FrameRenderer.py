@@ -0,0 +1,267 @@
+import numpy as np
+
+from helpers.Constants import ACTIVE, BACKGROUND, SE, SEIZURE
+
+WHITE = np.array([255, 255, 255], dtype=np.float32)
+BLACK = np.array([0, 0, 0], dtype=np.float32)
+RED = np.array([255, 0, 0], dtype=np.float32)
+
+
+def rgb(color):
+    return np.array(color.getRgb()[:3], dtype=np.float32)
+
+
+def event_array(times):
+    times = np.asarray(times, dtype=np.float64)
+    if times.size == 0:
+        return np.empty((0, 3))
+    if times.ndim < 2:
+        times = times.reshape(1, -1)
+    return times[:, :3]
+
+
+def hsv_to_rgb(hue, saturation, value):
+    """Vectorized HSV -> RGB for hue in degrees and saturation/value in 0..255."""
+    h = (hue % 360) / 60.0
+    s = saturation / 255.0
+    v = value.astype(np.float32)
+    c = v * s
+    x = c * (1 - np.abs(h % 2 - 1))
+    m = v - c
+    sector = np.floor(h).astype(int) % 6
+    zeros = np.zeros_like(c)
+    r = np.choose(sector, [c, x, zeros, zeros, x, c])
+    g = np.choose(sector, [x, c, c, x, zeros, zeros])
+    b = np.choose(sector, [zeros, zeros, x, c, c, x])
+    return np.stack((r + m, g + m, b + m), axis=-1)
+
+
+def scale_saturation(colors, strength):
+    # Scaling HSV saturation with hue and value held fixed pulls each
+    # channel toward the brightest one
+    value = colors.max(axis=-1, keepdims=True)
+    return value - (value - colors) * np.clip(strength, 0, 1)[..., None]
+
+
+class FrameRenderer:
+    """Draws video frames of the grid and plotted traces directly from the recording arrays."""
+
+    def __init__(
+        self,
+        signals,
+        sampling_rate,
+        active_channels,
+        se_times,
+        seizure_times,
+        traces=(),
+        false_color=True,
+        show_events=True,
+        bin_size=0.0133,
+        opacity=1.0,
+        strength_range=None,
+        voltage_range=None,
+        cell_size=8,
+        grid_size=64,
+    ):
+        self.signals = signals
+        self.sampling_rate = sampling_rate
+        self.false_color = false_color
+        self.show_events = show_events
+        self.bin_size = bin_size
+        self.opacity = opacity
+        self.cell_size = cell_size
+        self.grid_size = grid_size
+        self.side = grid_size * cell_size
+
+        channels = np.asarray(active_channels, dtype=int).reshape(-1, 2) - 1
+        self.cell_index = channels[:, 0] * grid_size + channels[:, 1]
+
+        if voltage_range is None:
+            ignore = int(20 * sampling_rate)
+            trimmed = signals[:, ignore:-ignore]
+            voltage_range = (np.min(trimmed), np.max(trimmed))
+        self.min_voltage, self.max_voltage = voltage_range
+
+        self.events = self.build_events(se_times, seizure_times, strength_range)
+        self.panel_height = self.side // max(len(traces), 1)
+        self.panels = [self.render_trace_panel(*trace) for trace in traces]
+        self.panel_windows = [trace[1] for trace in traces]
+
+    @classmethod
+    def from_main_window(cls, main_window, cell_size=8):
+        if getattr(main_window, "signals", None) is None:
+            main_window.initialize_data()
+
+        traces = []
+        graph_widget = main_window.graph_widget
+        for i, cell in enumerate(main_window.plotted_channels):
+            if cell is None:
+                continue
+            channel_data = main_window.data[cell.row, cell.col]
+            view_range = graph_widget.plot_widgets[i].getPlotItem().viewRange()
+            regions = ([], [])
+            if graph_widget.do_show_regions:
+                regions = graph_widget.get_regions(
+                    event_array(channel_data["SzTimes"]),
+                    event_array(channel_data["SETimes"]),
+                )
+            traces.append(
+                (channel_data["signal"], view_range[0], view_range[1], regions)
+            )
+
+        strength_range = None
+        if not main_window.use_cpp and main_window.min_strength is not None:
+            strength_range = (main_window.min_strength, main_window.max_strength)
+
+        voltage_range = None
+        if main_window.overall_min_voltage is not None:
+            voltage_range = (
+                main_window.overall_min_voltage,
+                main_window.overall_max_voltage,
+            )
+
+        return cls(
+            main_window.signals,
+            main_window.sampling_rate,
+            main_window.active_channels,
+            main_window.se_times_list,
+            main_window.seizure_times_list,
+            traces,
+            false_color=main_window.do_show_false_color_map,
+            show_events=main_window.do_show_events,
+            bin_size=main_window.bin_size,
+            opacity=main_window.opacity,
+            strength_range=strength_range,
+            voltage_range=voltage_range,
+            cell_size=cell_size,
+        )
+
+    def build_events(self, se_times, seizure_times, strength_range):
+        # One flat table of (start, stop, strength, channel) per event kind so a
+        # frame only needs a couple of vectorized comparisons
+        events = {}
+        for kind, times_list, exponent in (
+            ("se", se_times, 0.25),
+            ("seizure", seizure_times, 1.0),
+        ):
+            tables = [event_array(times) for times in times_list]
+            channel = np.concatenate(
+                [np.full(len(table), i) for i, table in enumerate(tables)] + [[]]
+            ).astype(int)
+            table = np.concatenate(tables + [np.empty((0, 3))])
+
+            strength = np.ones(len(table))
+            if strength_range is not None and strength_range[1] > strength_range[0]:
+                low, high = strength_range
+                strength = np.sqrt(np.clip((table[:, 2] - low) / (high - low), 0, 1))
+            events[kind] = (table[:, 0], table[:, 1], strength**exponent, channel)
+        return events
+
+    def get_channel_colors(self, time):
+        if not self.false_color:
+            return np.tile(rgb(ACTIVE), (len(self.cell_index), 1))
+
+        bin_start = max(int((time - self.bin_size) * self.sampling_rate), 0)
+        bin_end = int((time + self.bin_size) * self.sampling_rate)
+        window = self.signals[:, bin_start:bin_end]
+        if window.shape[1] == 0:
+            return np.tile(rgb(ACTIVE), (len(self.cell_index), 1))
+
+        span = self.max_voltage - self.min_voltage
+        low = np.log1p((window.min(axis=1) - self.min_voltage) / span + 1e-10)
+        high = np.log1p((window.max(axis=1) - self.min_voltage) / span + 1e-10)
+        log_range = high - low
+
+        hue = ((1 - np.tanh(5 * log_range)) * 240).astype(int)
+        value = np.where(log_range > 0, 255, 128)
+        colors = hsv_to_rgb(hue, np.full(hue.shape, 255), value)
+        gray = np.floor(colors @ np.array([0.299, 0.587, 0.114], dtype=np.float32))
+        return np.repeat(gray[:, None], 3, axis=1)
+
+    def apply_events(self, colors, time):
+        strength = np.ones(len(colors))
+        base = colors.copy()
+        # Seizures first so SE wins where both are active, and iterate each
+        # table backwards so the earliest matching event is the one kept
+        for kind, color in (("seizure", SEIZURE), ("se", SE)):
+            start, stop, event_strength, channel = self.events[kind]
+            hits = np.flatnonzero((start <= time) & (time <= stop))[::-1]
+            if hits.size == 0:
+                continue
+            target = channel[hits]
+            if self.false_color:
+                colors[target] = np.floor(
+                    base[target] + (rgb(color) - base[target]) / 2
+                )
+            else:
+                colors[target] = rgb(color)
+            strength[target] = event_strength[hits]
+        return scale_saturation(colors, strength)
+
+    def render_grid(self, time):
+        colors = self.get_channel_colors(time)
+        if self.show_events:
+            colors = self.apply_events(colors, time)
+        colors = colors * self.opacity + rgb(BACKGROUND) * (1 - self.opacity)
+
+        grid = np.tile(rgb(BACKGROUND), (self.grid_size * self.grid_size, 1))
+        grid[self.cell_index] = colors
+        grid = grid.reshape(self.grid_size, self.grid_size, 3)
+        return np.repeat(np.repeat(grid, self.cell_size, 0), self.cell_size, 1)
+
+    def render_trace_panel(self, signal, x_range, y_range, regions):
+        """Static image of one trace view, drawn as a per-column min/max envelope."""
+        width, height = self.side, self.panel_height
+        panel = np.tile(WHITE, (height, width, 1))
+        x0, x1 = x_range
+        y0, y1 = y_range
+        if x1 <= x0 or y1 <= y0:
+            return panel.astype(np.uint8)
+
+        columns = x0 + (np.arange(width) + 0.5) * (x1 - x0) / width
+        seizure_regions, se_regions = regions
+        for color, spans in ((SE, se_regions), (SEIZURE, seizure_regions)):
+            for start, stop in spans:
+                inside = (columns >= start) & (columns <= stop)
+                panel[:, inside] = (panel[:, inside] + rgb(color)) / 2
+
+        signal = np.asarray(signal).squeeze()
+        i0 = max(int(np.floor(x0 * self.sampling_rate)), 0)
+        i1 = min(int(np.ceil(x1 * self.sampling_rate)) + 1, signal.size)
+        if i1 - i0 < 2:
+            return panel.astype(np.uint8)
+
+        if i1 - i0 >= width:
+            edges = np.linspace(i0, i1, width + 1).astype(int)[:-1]
+            low = np.minimum.reduceat(signal[i0:i1], edges - i0)
+            high = np.maximum.reduceat(signal[i0:i1], edges - i0)
+        else:
+            # Fewer samples than pixels: interpolate and join neighbouring columns
+            values = np.interp(
+                columns * self.sampling_rate, np.arange(i0, i1), signal[i0:i1]
+            )
+            previous = np.concatenate(([values[0]], values[:-1]))
+            low, high = np.minimum(values, previous), np.maximum(values, previous)
+
+        scale = (height - 1) / (y1 - y0)
+        top = np.clip(np.floor((y1 - high) * scale) - 1, 0, height - 1)
+        bottom = np.clip(np.ceil((y1 - low) * scale) + 1, 0, height - 1)
+        rows = np.arange(height)[:, None]
+        visible = (high >= y0) & (low <= y1)
+        panel[(rows >= top) & (rows <= bottom) & visible] = BLACK
+        return panel.astype(np.uint8)
+
+    def render(self, time):
+        """Return the frame at `time` seconds as an (H, W, 3) uint8 RGB array."""
+        frame = np.empty((self.side, 2 * self.side, 3), dtype=np.uint8)
+        frame[:, : self.side] = self.render_grid(time)
+        frame[:, self.side :] = 255
+
+        height = self.panel_height
+        for i, (panel, (x0, x1)) in enumerate(zip(self.panels, self.panel_windows)):
+            top = i * height
+            frame[top : top + height, self.side :] = panel
+            if x0 <= time <= x1 and x1 > x0:
+                col = self.side + int((time - x0) / (x1 - x0) * (self.side - 1))
+                frame[top : top + height, max(col - 1, self.side) : col + 1] = RED
+        return frame
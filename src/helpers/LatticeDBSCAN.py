@@ -0,0 +1,90 @@
+import math
+from functools import lru_cache
+
+import numpy as np
+
+
+@lru_cache(maxsize=None)
+def disk_offsets(eps):
+    """Integer (dr, dc) offsets within Euclidean distance eps of the origin."""
+    radius = int(math.floor(eps))
+    dr, dc = np.mgrid[-radius : radius + 1, -radius : radius + 1]
+    inside = dr**2 + dc**2 <= eps**2
+    return np.column_stack((dr[inside], dc[inside]))
+
+
+def lattice_dbscan(frames, eps, min_samples):
+    """DBSCAN labels for integer (row, col) points, for many frames at once.
+
+    Each frame is an (n, 2) array of distinct grid cells. Neighbourhoods are
+    looked up on the lattice instead of through a spatial index, and the
+    labels match sklearn's DBSCAN for the same point order, including which
+    cluster claims a border point shared by two clusters.
+    """
+    frames = [np.asarray(cells, dtype=int).reshape(-1, 2) for cells in frames]
+    sizes = np.array([len(cells) for cells in frames])
+    if sizes.sum() == 0:
+        return [np.empty(0, dtype=int) for _ in frames]
+
+    points = np.concatenate(frames)
+    frame_of = np.repeat(np.arange(len(frames)), sizes)
+    offsets = disk_offsets(eps)
+    radius = int(math.floor(eps))
+
+    # One padded index grid per frame: cell -> point index, or -1 if empty
+    origin = points.min(axis=0) - radius
+    shifted = points - origin
+    shape = (len(frames),) + tuple(shifted.max(axis=0) + radius + 1)
+    grid = np.full(shape, -1, dtype=np.int64)
+    grid[frame_of, shifted[:, 0], shifted[:, 1]] = np.arange(len(points))
+
+    neighbors = grid[
+        frame_of[:, None],
+        shifted[:, 0, None] + offsets[:, 0],
+        shifted[:, 1, None] + offsets[:, 1],
+    ]
+    has_neighbor = neighbors >= 0
+    is_core = has_neighbor.sum(axis=1) >= min_samples
+
+    # Core points within eps of each other form one cluster. Spreading the
+    # smallest index through each component labels it by its first core
+    # point, which is also how sklearn numbers clusters
+    index = np.arange(len(points))
+    safe = np.maximum(neighbors, 0)
+    core_neighbor = has_neighbor & is_core[safe]
+    links = np.where(core_neighbor & is_core[:, None], safe, index[:, None])
+    first_core = index.copy()
+    while True:
+        spread = np.minimum(first_core, first_core[links].min(axis=1))
+        spread = spread[spread]
+        if np.array_equal(spread, first_core):
+            break
+        first_core = spread
+
+    # A border point goes to the earliest cluster with a core point in reach
+    no_cluster = len(points)
+    border_rank = np.where(core_neighbor, first_core[safe], no_cluster).min(axis=1)
+    rank = np.where(is_core, first_core, border_rank)
+
+    labels = []
+    for start, stop in zip(np.cumsum(sizes) - sizes, np.cumsum(sizes)):
+        frame_rank = rank[start:stop]
+        clustered = frame_rank < no_cluster
+        frame_labels = np.full(stop - start, -1)
+        _, cluster_numbers = np.unique(frame_rank[clustered], return_inverse=True)
+        frame_labels[clustered] = cluster_numbers
+        labels.append(frame_labels)
+    return labels
+
+
+def lattice_centroids(frames, eps, min_samples):
+    """Per frame, the mean (row, col) of each cluster in label order, noise dropped."""
+    centroids = []
+    for cells, labels in zip(frames, lattice_dbscan(frames, eps, min_samples)):
+        cells = np.asarray(cells, dtype=float).reshape(-1, 2)
+        centroids.append(
+            [cells[labels == label].mean(axis=0) for label in range(labels.max() + 1)]
+            if labels.size
+            else []
+        )
+    return centroids
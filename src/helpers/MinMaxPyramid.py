@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+
+
+def minmax_decimate(x, y, num_points):
+    """Reduce (x, y) to at most num_points samples, keeping each bucket's min and max."""
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if y.size <= num_points or num_points < 2:
+        return x, y
+
+    bucket = -(-y.size // (num_points // 2))
+    starts = np.arange(0, y.size, bucket)
+    # Pad the short last bucket with its final sample, which cannot change its extremes
+    padded = np.pad(y, (0, starts.size * bucket - y.size), mode="edge")
+    padded = padded.reshape(-1, bucket)
+
+    last = y.size - 1
+    lo = np.minimum(starts + padded.argmin(axis=1), last)
+    hi = np.minimum(starts + padded.argmax(axis=1), last)
+    # Emit each pair in time order so the overview keeps the trace's shape
+    indices = np.column_stack((np.minimum(lo, hi), np.maximum(lo, hi))).ravel()
+    return x[indices], y[indices]
+
+
+class MinMaxPyramid:
+    """Min/max envelopes of a uniformly sampled trace at successively coarser block sizes."""
+
+    def __init__(self, y, x0, dt, factor=4, min_blocks=2048):
+        self.y = np.asarray(y)
+        self.x0 = float(x0)
+        self.dt = float(dt)
+        self.size = self.y.size
+        self.levels = []
+
+        block, mins, maxs = 1, self.y, self.y
+        while mins.size > min_blocks:
+            full = mins.size // factor * factor
+            next_mins = mins[:full].reshape(-1, factor).min(axis=1)
+            next_maxs = maxs[:full].reshape(-1, factor).max(axis=1)
+            if full < mins.size:
+                next_mins = np.append(next_mins, mins[full:].min())
+                next_maxs = np.append(next_maxs, maxs[full:].max())
+            block *= factor
+            mins, maxs = next_mins, next_maxs
+            self.levels.append((block, mins, maxs))
+
+    @classmethod
+    def from_xy(cls, x, y, **kwargs):
+        dt = (x[-1] - x[0]) / (len(x) - 1) if len(x) > 1 else 1.0
+        return cls(y, x[0] if len(x) > 0 else 0.0, dt, **kwargs)
+
+    def matches(self, x, y):
+        return self.size == len(y) and (self.size == 0 or self.x0 == float(x[0]))
+
+    def x_bounds(self):
+        return self.x0, self.x0 + max(self.size - 1, 0) * self.dt
+
+    def query(self, x_start, x_end, max_points):
+        """Return the finest (x, y) series for the span that fits in max_points."""
+        i0 = int(np.clip(math.floor((x_start - self.x0) / self.dt), 0, self.size))
+        i1 = int(np.clip(math.ceil((x_end - self.x0) / self.dt) + 1, 0, self.size))
+        span = i1 - i0
+        if span <= max_points or not self.levels:
+            return self.x0 + np.arange(i0, i1) * self.dt, self.y[i0:i1]
+
+        block, mins, maxs = self.levels[-1]
+        for level in self.levels:
+            if 2 * span / level[0] <= max_points:
+                block, mins, maxs = level
+                break
+
+        b0 = i0 // block
+        b1 = min(mins.size, -(-i1 // block))
+        x = self.x0 + np.repeat(np.arange(b0, b1) * block, 2) * self.dt
+        y = np.column_stack((mins[b0:b1], maxs[b0:b1])).ravel()
+        return x, y
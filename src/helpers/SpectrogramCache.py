@@ -0,0 +1,93 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import detrend, get_window
+
+
+def compute_spectrogram(
+    signal,
+    fs,
+    chunk_size,
+    overlap,
+    fs_range,
+    start=None,
+    stop=None,
+    max_columns=None,
+):
+    """PSD spectrogram (dB) of signal[start:stop], matching scipy.signal.spectrogram.
+
+    When the window holds more segments than max_columns, segments are taken
+    at a coarser hop so the cost follows the on-screen resolution rather than
+    the recording length. Returns (freqs, times, hop, Sxx_db).
+    """
+    signal = np.asarray(signal, dtype=np.float64).squeeze()
+    hop = chunk_size - overlap
+    i0 = 0 if start is None else max(0, int(start * fs))
+    i1 = signal.size if stop is None else min(signal.size, int(math.ceil(stop * fs)))
+    if i1 - i0 < chunk_size:
+        i0 = max(0, i1 - chunk_size)
+    segment_count = max(1, (i1 - i0 - chunk_size) // hop + 1)
+    if max_columns is not None and segment_count > max_columns:
+        hop *= math.ceil(segment_count / max_columns)
+
+    samples = signal[i0:i1]
+    if samples.size < chunk_size:
+        # Too short for one segment: zero-pad so the frequency axis stays the same
+        samples = np.pad(samples, (0, chunk_size - samples.size))
+    segments = sliding_window_view(samples, chunk_size)[::hop]
+    window = get_window("hann", chunk_size)
+    spectrum = np.fft.rfft(detrend(segments, type="constant") * window, n=chunk_size)
+
+    Sxx = np.abs(spectrum) ** 2 / (fs * np.sum(window**2))
+    if chunk_size % 2:
+        Sxx[:, 1:] *= 2
+    else:
+        Sxx[:, 1:-1] *= 2
+
+    freqs = np.fft.rfftfreq(chunk_size, 1 / fs)
+    times = (i0 + np.arange(segments.shape[0]) * hop + chunk_size / 2) / fs
+
+    freq_mask = (freqs >= fs_range[0]) & (freqs <= fs_range[1])
+    with np.errstate(divide="ignore"):
+        Sxx_db = 10 * np.log10(Sxx.T[freq_mask, :])
+
+    return freqs[freq_mask], times, hop, Sxx_db
+
+
+class SpectrogramCache:
+    """LRU of computed spectrogram tiles plus one color scale per channel and settings."""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.tiles = OrderedDict()
+        self.levels = {}
+
+    def get(self, key):
+        if key not in self.tiles:
+            return None
+        self.tiles.move_to_end(key)
+        return self.tiles[key]
+
+    def put(self, key, tile):
+        self.tiles[key] = tile
+        self.tiles.move_to_end(key)
+        while len(self.tiles) > self.max_entries:
+            self.tiles.popitem(last=False)
+
+        # Keep the first color scale seen for these settings so zooming in
+        # does not re-stretch the colormap
+        settings_key = key[:4]
+        if settings_key not in self.levels:
+            Sxx_db = tile[3]
+            finite = Sxx_db[np.isfinite(Sxx_db)]
+            if finite.size > 0:
+                self.levels[settings_key] = (float(finite.min()), float(finite.max()))
+
+    def get_levels(self, key):
+        return self.levels.get(key[:4])
+
+    def clear(self):
+        self.tiles.clear()
+        self.levels.clear()
@@ -0,0 +1,51 @@
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.signal import find_peaks
+
+
+def detect_channel_spikes(signal, threshold, distance):
+    peaks, _ = find_peaks(
+        np.asarray(signal).squeeze(),
+        height=threshold,
+        distance=max(1, int(distance)),
+    )
+    return peaks
+
+
+class SpikeDetector:
+    """Scan channels at full rate in a thread pool, caching spike indices per (threshold, distance)."""
+
+    def __init__(self, max_workers=None, max_cached_settings=8):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_cached_settings = max_cached_settings
+        self.cache = OrderedDict()
+
+    def detect(self, data, channels, threshold, distance):
+        key = (float(threshold), int(distance))
+        if key in self.cache:
+            self.cache.move_to_end(key)
+        else:
+            self.cache[key] = {}
+            while len(self.cache) > self.max_cached_settings:
+                self.cache.popitem(last=False)
+        spikes = self.cache[key]
+
+        missing = [channel for channel in channels if channel not in spikes]
+        if missing:
+
+            def scan(channel):
+                row, col = channel
+                return detect_channel_spikes(
+                    data[row - 1, col - 1]["signal"], threshold, distance
+                )
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                spikes.update(zip(missing, pool.map(scan, missing)))
+
+        return [spikes[channel] for channel in channels]
+
+    def clear(self):
+        self.cache.clear()
@@ -0,0 +1,37 @@
+JOURNAL_GROUP = "/.undo_journal"
+
+
+class UndoJournal:
+    """Deleted HDF5 objects parked in a hidden group of the same file.
+
+    Staging and restoring only move links, so neither copies any data. Objects
+    are unlinked for good when discarded or when the journal is committed.
+    """
+
+    def __init__(self, hdf5, group_name=JOURNAL_GROUP):
+        self.hdf5 = hdf5
+        self.group_name = group_name
+        staged = hdf5[group_name].keys() if group_name in hdf5 else []
+        self.next_id = max((int(name) + 1 for name in staged), default=0)
+
+    def stage(self, path):
+        """Move the object at path into the journal and return its staged path."""
+        if self.group_name not in self.hdf5:
+            self.hdf5.create_group(self.group_name)
+        staged_path = f"{self.group_name}/{self.next_id}"
+        self.next_id += 1
+        self.hdf5.move(path, staged_path)
+        return staged_path
+
+    def restore(self, staged_path, path):
+        self.hdf5.move(staged_path, path)
+
+    def discard(self, staged_path):
+        if staged_path in self.hdf5:
+            del self.hdf5[staged_path]
+
+    def commit(self):
+        """Drop everything staged so the file space can be reused."""
+        if self.group_name in self.hdf5:
+            del self.hdf5[self.group_name]
+        self.next_id = 0
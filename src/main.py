@@ -1,6 +1,7 @@
 import gc
 import glob
 import math
+import multiprocessing
 import os
 import sys
 from pathlib import Path
@@ -54,13 +55,10 @@ from PyQt5.QtWidgets import (
     QVBoxLayout,
     QWidget,
 )
-from scipy.signal import spectrogram
-from sklearn.cluster import DBSCAN
 
 from helpers.Constants import (
     ACTIVE,
     BACKGROUND,
-    CELL_SIZE,
     FONT_FAMILY,
     FONT_FILE,
     LARGE_FONT_SIZE,
@@ -72,11 +70,20 @@ from helpers.Constants import (
     VERSION,
     WIN,
 )
+from helpers.DischargeExport import parquet_available
+from helpers.DischargeIndex import DischargeIndex
+from helpers.DischargeStore import read_discharges
+from helpers.DischargeTracker import DischargeTracker
+from helpers.LatticeDBSCAN import lattice_dbscan
+from helpers.SpectrogramCache import SpectrogramCache
+from helpers.SpikeDetector import SpikeDetector
 from helpers.update.Updater import check_for_update
 from threads.AnalysisThread import AnalysisThread
 from threads.MatlabEngineThread import MatlabEngineThread
 from threads.UpdateThread import UpdateThread
 from threads.DischargeFinderThread import DischargeFinderThread
+from threads.DischargeTrackingThread import DischargeTrackingThread
+from threads.SpectrogramThread import SpectrogramThread
 from widgets.ChannelExtract import ChannelExtract
 from widgets.ClusterTracker import ClusterTracker
 from widgets.ColorCell import ColorCell
@@ -145,6 +152,7 @@ class MainWindow(QMainWindow):
         # Raster settings
         self.raster_tooltip = None
         self.raster_downsample_factor = 1
+        self.spike_detector = SpikeDetector()
         self.opacity = 1.0
         self.do_show_spread_lines = False
         self.do_show_prop_lines = False
@@ -161,11 +169,13 @@ class MainWindow(QMainWindow):
         # Peak and discharge settings
         self.peak_thresholds = {}
         self.discharges = {}
+        self.discharge_index = None
         self.show_discharge_peaks = False
         self.active_discharges = []
         self.snr_threshold = 35
-        self.current_discharge_index = 0
         self.is_auto_analyzing = False
+        self.discharge_tracking_thread = None
+        self.tracking_dialog = None
         self.low_pass_cutoff = 35
         self.discharge_starts_points = []
         self.discharge_start_dialog: DischargeStartDialog = None
@@ -194,6 +204,14 @@ class MainWindow(QMainWindow):
         self.chunk_size = 256
         self.overlap = 0
         self.fs_range = (0.5, 50)
+        self.spectrogram_cache = SpectrogramCache()
+        self.spectrogram_items = [None] * 4
+        self.spectrogram_generation = [0] * 4
+        self.spectrogram_threads = []
+        self.spectrogram_refine_timer = QTimer()
+        self.spectrogram_refine_timer.setSingleShot(True)
+        self.spectrogram_refine_timer.setInterval(150)
+        self.spectrogram_refine_timer.timeout.connect(self.request_spectrograms)
         self.centroids = []
         self.eps = 4.8
         self.min_samples = 4
@@ -644,11 +662,19 @@ class MainWindow(QMainWindow):
         self.redraw_arrows()
 
     # TODO: Notify of creation/success status
-    def export_discharge_stats(self):
+    def export_discharge_stats(self, output_format="zip"):
         if self.cluster_tracker is None or self.file_path is Path():
             return
 
-        self.cluster_tracker.export_discharges_to_zip(self.file_path)
+        if output_format == "parquet" and not parquet_available:
+            QMessageBox.warning(
+                self,
+                "Parquet Unavailable",
+                "Exporting to Parquet requires the pyarrow package.",
+            )
+            return
+
+        self.cluster_tracker.export_discharges(self.file_path, output_format)
 
     def open_docs(self):
         cwd = Path(__file__).resolve().parent
@@ -708,12 +734,7 @@ class MainWindow(QMainWindow):
             if self.plotted_channels[i] is not None:
                 self.graph_widget.plot_widgets[i].clear()
 
-                curve = self.graph_widget.plot_widgets[i].plot(
-                    pen=pg.mkPen("k", width=3)
-                )
-                curve.setData(self.graph_widget.x_data[i], self.graph_widget.y_data[i])
-                curve.setDownsampling(auto=True, method="peak", ds=100)
-                curve.setClipToView(True)
+                self.graph_widget.create_trace_curve(i)
 
                 self.graph_widget.plot_widgets[i].addItem(
                     self.graph_widget.red_lines[i]
@@ -803,6 +824,7 @@ class MainWindow(QMainWindow):
                 self.sampling_rate,
                 self.active_channels,
                 self.raster_downsample_factor,
+                self.spike_detector,
             )
             self.raster_plot.set_main_window(self)
 
@@ -972,56 +994,133 @@ class MainWindow(QMainWindow):
                 continue
             self.graph_widget.trace_curves[i].setVisible(False)
 
-            eeg_data = self.data[
-                self.plotted_channels[i].row,
-                self.plotted_channels[i].col,
-            ]["signal"]
-
             print(f"Creating spectrogram for channel {i + 1}")
 
-            f, _, Sxx = spectrogram(
-                eeg_data,
-                fs=self.sampling_rate,
-                window="hann",
-                nperseg=self.chunk_size,
-                noverlap=self.overlap,
-                nfft=self.chunk_size,
-                scaling="density",
-                mode="psd",
-            )
+            cmap = pg.colormap.get("inferno")
+            img = pg.ImageItem()
+            img.setLookupTable(cmap.getLookupTable())
+            self.graph_widget.plot_widgets[i].setLabels(left="Hz")
+            self.graph_widget.plot_widgets[i].addItem(img)
+            img.setZValue(-1)
+            self.spectrogram_items[i] = img
 
-            Sxx_db = 10 * np.log10(Sxx)
+            view_box = self.graph_widget.plot_widgets[i].getViewBox()
+            view_box.sigXRangeChanged.connect(self.schedule_spectrogram_refine)
 
-            freq_mask = (f >= self.fs_range[0]) & (f <= self.fs_range[1])
-            Sxx_db = Sxx_db[freq_mask, :]
+        # Start from the whole recording, then refine whatever the user zooms into
+        self.request_spectrograms(full_range=True)
 
-            cmap = pg.colormap.get("inferno")
-            lut = cmap.getLookupTable()
+    def schedule_spectrogram_refine(self, *args):
+        self.spectrogram_refine_timer.start()
 
-            img = pg.ImageItem()
-            img.setLookupTable(lut)
-            img.setLevels([np.min(Sxx_db), np.max(Sxx_db)])
-            img.setImage(Sxx_db.T, autoLevels=False)
+    def request_spectrograms(self, full_range=False):
+        jobs = []
+        for i in range(4):
+            img = self.spectrogram_items[i]
+            if img is None or self.plotted_channels[i] is None:
+                continue
+            row, col = self.plotted_channels[i].row, self.plotted_channels[i].col
+            plot_widget = self.graph_widget.plot_widgets[i]
 
-            x_range = (self.time_vector[0], self.time_vector[-1])
-            y_range = (f[freq_mask][0], f[freq_mask][-1])
-            self.graph_widget.plot_widgets[i].setLabels(left="Hz")
+            if full_range:
+                start, stop = self.time_vector[0], self.time_vector[-1]
+            else:
+                # Pad and snap the window to half-spans so small pans hit the cache
+                view_start, view_stop = plot_widget.viewRange()[0]
+                half_span = max((view_stop - view_start) / 2, 1 / self.sampling_rate)
+                start = math.floor(view_start / half_span - 1) * half_span
+                stop = math.ceil(view_stop / half_span + 1) * half_span
+            max_columns = max(200, int(plot_widget.getViewBox().width()))
+            if not full_range:
+                max_columns *= 2
+
+            key = (
+                (row, col),
+                self.chunk_size,
+                self.overlap,
+                tuple(self.fs_range),
+                round(start, 6),
+                round(stop, 6),
+                max_columns,
+            )
+            self.spectrogram_generation[i] += 1
+            tile = self.spectrogram_cache.get(key)
+            if tile is not None:
+                self.apply_spectrogram_tile(i, key, tile, full_range)
+                continue
 
-            img.setRect(
-                QRectF(
-                    x_range[0],
-                    y_range[0],
-                    x_range[1] - x_range[0],
-                    y_range[1] - y_range[0],
-                )
+            kwargs = {
+                "signal": self.data[row, col]["signal"],
+                "fs": self.sampling_rate,
+                "chunk_size": self.chunk_size,
+                "overlap": self.overlap,
+                "fs_range": self.fs_range,
+                "start": start,
+                "stop": stop,
+                "max_columns": max_columns,
+            }
+            jobs.append((i, self.spectrogram_generation[i], key, kwargs))
+
+        if not jobs:
+            return
+
+        thread = SpectrogramThread(jobs)
+        thread.spectrogram_ready.connect(
+            lambda i, generation, key, tile: self.on_spectrogram_ready(
+                i, generation, key, tile, full_range
             )
+        )
+        thread.finished.connect(lambda: self.spectrogram_threads.remove(thread))
+        self.spectrogram_threads.append(thread)
+        thread.start()
+
+    def on_spectrogram_ready(self, i, generation, key, tile, full_range):
+        self.spectrogram_cache.put(key, tile)
+        # Drop results that were superseded by a newer zoom or a hide
+        if generation != self.spectrogram_generation[i]:
+            return
+        self.apply_spectrogram_tile(i, key, tile, full_range)
 
-            self.graph_widget.plot_widgets[i].addItem(img)
-            img.setZValue(-1)
+    def apply_spectrogram_tile(self, i, key, tile, full_range):
+        img = self.spectrogram_items[i]
+        if img is None:
+            return
+        freqs, times, hop, Sxx_db = tile
+        if freqs.size == 0 or times.size == 0:
+            return
+
+        levels = self.spectrogram_cache.get_levels(key)
+        if levels is not None:
+            img.setLevels(levels)
+        img.setImage(Sxx_db.T, autoLevels=False)
+
+        column_width = hop / self.sampling_rate
+        x_start = times[0] - column_width / 2
+        img.setRect(
+            QRectF(
+                x_start,
+                freqs[0],
+                times[-1] + column_width / 2 - x_start,
+                freqs[-1] - freqs[0],
+            )
+        )
+
+        if full_range:
             self.graph_widget.plot_widgets[i].getViewBox().autoRange()
 
     def hide_spectrograms(self):
         for i in range(4):
+            self.spectrogram_generation[i] += 1
+            if self.spectrogram_items[i] is not None:
+                view_box = self.graph_widget.plot_widgets[i].getViewBox()
+                try:
+                    view_box.sigXRangeChanged.disconnect(
+                        self.schedule_spectrogram_refine
+                    )
+                except TypeError:
+                    pass
+                self.spectrogram_items[i] = None
+
             for item in self.graph_widget.plot_widgets[i].items():
                 if isinstance(item, pg.ImageItem):
                     self.graph_widget.plot_widgets[i].removeItem(item)
@@ -1071,6 +1170,7 @@ class MainWindow(QMainWindow):
                 self.sampling_rate,
                 group.channels,
                 self.raster_downsample_factor,
+                self.spike_detector,
             )
             group_raster_plot.generate_raster()
             group_raster_plot.create_raster_plot(raster_plot_widget)
@@ -1273,6 +1373,7 @@ class MainWindow(QMainWindow):
                 self.sampling_rate,
                 self.active_channels,
                 self.raster_downsample_factor,
+                self.spike_detector,
             )
             self.raster_plot.set_main_window(self)
         if index == 0:
@@ -1303,6 +1404,7 @@ class MainWindow(QMainWindow):
                 self.sampling_rate,
                 self.active_channels,
                 self.raster_downsample_factor,
+                self.spike_detector,
             )
             self.raster_plot.set_main_window(self)
         else:
@@ -1371,7 +1473,8 @@ class MainWindow(QMainWindow):
                 ignore = int(10 * self.sampling_rate)
 
                 self.graph_widget.plot(
-                    self.time_vector[ignore:-ignore],
+                    np.arange(ignore, len(self.time_vector) - ignore)
+                    / self.sampling_rate,
                     self.data[row, col]["signal"][ignore:-ignore],
                     f"{shape_mapping[index]} Channel ({row + 1}, {col + 1})",
                     "sec",
@@ -1380,6 +1483,7 @@ class MainWindow(QMainWindow):
                     shape_mapping[index],
                     seizures,
                     se,
+                    channel=(row, col),
                 )
 
                 self.graph_widget.plot_peaks()
@@ -1485,7 +1589,7 @@ class MainWindow(QMainWindow):
                 self.auto_analyze()
             elif event.key() == Qt.Key_T:
                 if self.is_auto_analyzing:
-                    self.is_auto_analyzing = False
+                    self.terminate_auto_analysis()
             elif event.key() == Qt.Key_M:
                 current_time = self.progress_bar.value() / self.sampling_rate
                 self.markers.append(current_time)
@@ -1518,6 +1622,8 @@ class MainWindow(QMainWindow):
 
     def terminate_auto_analysis(self):
         self.is_auto_analyzing = False
+        if self.discharge_tracking_thread is not None:
+            self.discharge_tracking_thread.requestInterruption()
 
     def load_discharges(self):
         try:
@@ -1534,82 +1640,9 @@ class MainWindow(QMainWindow):
                 )
                 if ok:
                     timerange_group = tracked_discharges_group[time_range]
-                    discharge_datasets = [
-                        key
-                        for key in timerange_group.keys()
-                        if key.startswith("discharge_")
-                    ]
-                    for discharge_key in discharge_datasets:
-                        discharge_dataset = timerange_group[discharge_key]
-                        attrs = discharge_dataset.attrs
-
-                        start_point = attrs["start_point"]
-                        end_point = attrs["end_point"]
-                        start_time = float(attrs["start_time"])
-                        end_time = float(attrs["end_time"])
-                        duration_s = float(attrs["duration"])
-                        length_mm = float(attrs["length"])
-                        avg_speed = float(attrs["avg_speed"])
-                        points = attrs["points"]
-                        timestamps = attrs["timestamps"]
-
-                        if "instant_speeds" in attrs:
-                            instant_speeds = attrs["instant_speeds"]
-                        else:
-                            points_list = (
-                                points.tolist() if hasattr(points, "tolist") else points
-                            )
-                            timestamps_list = (
-                                timestamps.tolist()
-                                if hasattr(timestamps, "tolist")
-                                else timestamps
-                            )
-                            instant_speeds = []
-                            for i in range(len(points_list) - 1):
-                                distance = (
-                                    np.linalg.norm(
-                                        np.array(points_list[i + 1])
-                                        - np.array(points_list[i])
-                                    )
-                                    * CELL_SIZE
-                                    / 1000
-                                )
-                                time_diff = timestamps_list[i + 1] - timestamps_list[i]
-                                speed = distance / time_diff if time_diff > 0 else 0
-                                instant_speeds.append(speed)
-                            instant_speeds.append(
-                                instant_speeds[-1] if instant_speeds else 0
-                            )
-
-                        time_since_last_discharge = float(
-                            attrs["time_since_last_discharge"]
-                        )
-
-                        seizure = {
-                            "start_time": start_time,
-                            "end_time": end_time,
-                            "duration": duration_s,
-                            "length": length_mm,
-                            "avg_speed": avg_speed,
-                            "points": points.tolist()
-                            if hasattr(points, "tolist")
-                            else points,
-                            "timestamps": timestamps.tolist()
-                            if hasattr(timestamps, "tolist")
-                            else timestamps,
-                            "instant_speeds": instant_speeds.tolist()
-                            if hasattr(instant_speeds, "tolist")
-                            else instant_speeds,
-                            "start_point": start_point.tolist()
-                            if hasattr(start_point, "tolist")
-                            else start_point,
-                            "end_point": end_point.tolist()
-                            if hasattr(end_point, "tolist")
-                            else end_point,
-                            "time_since_last_discharge": time_since_last_discharge,
-                        }
-
-                        self.cluster_tracker.seizures.append(seizure)
+                    self.cluster_tracker.seizures.extend(
+                        read_discharges(timerange_group)
+                    )
         except Exception as e:
             print(f"Error loading discharges: {e}")
             print("Attempting to load deprecated discharges")
@@ -1665,6 +1698,8 @@ class MainWindow(QMainWindow):
     def auto_analyze(self):
         if self.custom_region is None or self.plotted_channels[0] is None:
             return
+        if self.discharge_tracking_thread is not None:
+            return
 
         self.togglePropLinesAction.setChecked(True)
         self.toggle_prop_lines(True)
@@ -1676,58 +1711,64 @@ class MainWindow(QMainWindow):
         row, col = self.plotted_channels[0].row, self.plotted_channels[0].col
         discharges_x, _ = self.discharges[row, col]
 
-        self.current_discharge_index = 0
         self.discharges_to_analyze = [x for x in discharges_x if start <= x <= stop]
 
         if not self.discharges_to_analyze:
             print("No discharges to analyze in the selected region")
             return
 
+        # Track every discharge window off screen instead of stepping the playhead
+        discharge_tracker = DischargeTracker(
+            self.active_channels,
+            self.discharges,
+            self.sampling_rate,
+            len(self.time_vector),
+            self.bin_size,
+            self.eps,
+            self.min_samples,
+            max_distance=self.cluster_tracker.max_distance,
+            min_consecutive_frames=self.cluster_tracker.min_consecutive_frames,
+            min_seizure_length=self.cluster_tracker.min_seizure_length,
+        )
+        self.discharge_tracking_thread = DischargeTrackingThread(
+            discharge_tracker, self.discharges_to_analyze, start, stop
+        )
+        self.discharge_tracking_thread.progress.connect(
+            self.on_discharge_tracking_progress
+        )
+        self.discharge_tracking_thread.tracking_finished.connect(
+            self.on_discharge_tracking_finished
+        )
+        self.tracking_dialog = LoadingDialog(self)
+        self.tracking_dialog.setWindowTitle("Tracking Discharges")
+        self.tracking_dialog.label.setText("Tracking discharges...")
+        self.tracking_dialog.progress_bar.setRange(0, len(self.discharges_to_analyze))
+        self.tracking_dialog.analysis_cancelled.connect(self.terminate_auto_analysis)
         self.is_auto_analyzing = True
-        self.analyze_next_discharge()
-
-    def analyze_next_discharge(self):
-        if not self.is_auto_analyzing or self.current_discharge_index >= len(
-            self.discharges_to_analyze
-        ):
-            if self.is_auto_analyzing:
-                print("Auto-analysis complete")
-
-                self.cluster_tracker.save_discharges_to_hdf5(
-                    self.file_path, *self.custom_region
-                )
+        self.discharge_tracking_thread.start()
+        self.tracking_dialog.show()
+
+    def on_discharge_tracking_progress(self, done, total):
+        self.tracking_dialog.update_progress(f"Tracked {done}/{total} discharges", done)
+
+    def on_discharge_tracking_finished(self, seizures):
+        thread = self.discharge_tracking_thread
+        thread.wait()
+        self.discharge_tracking_thread = None
+        self.tracking_dialog.hide()
+        self.tracking_dialog.deleteLater()
+        self.tracking_dialog = None
+        if not self.is_auto_analyzing or seizures is None:
             self.is_auto_analyzing = False
             return
 
-        discharge_x = self.discharges_to_analyze[self.current_discharge_index]
-        print(f"Analyzing discharge at {discharge_x}")
-        discharge_index = int(discharge_x * self.sampling_rate)
-        start_index = max(0, discharge_index - int(0.1 * self.sampling_rate))
-        end_index = min(
-            len(self.time_vector) - 1, discharge_index + int(0.15 * self.sampling_rate)
+        print("Auto-analysis complete")
+        self.cluster_tracker.seizures = seizures
+        self.cluster_tracker.last_seizure = seizures[-1] if seizures else None
+        self.cluster_tracker.save_discharges_to_hdf5(
+            self.file_path, thread.start_range, thread.stop_range
         )
-
-        self.progress_bar.setValue(start_index)
-        self.update_grid()
-        if self.lock_to_playhead:
-            self.lock_plots_to_playhead()
-
-        QTimer.singleShot(50, lambda: self.continue_analysis(end_index))
-
-    def continue_analysis(self, end_index):
-        if not self.is_auto_analyzing:
-            return
-
-        current_index = self.progress_bar.value()
-        if current_index < end_index:
-            self.progress_bar.setValue(current_index + 1)
-            self.update_grid()
-            if self.lock_to_playhead:
-                self.lock_plots_to_playhead()
-            QTimer.singleShot(5, lambda: self.continue_analysis(end_index))
-        else:
-            self.current_discharge_index += 1
-            QTimer.singleShot(50, self.analyze_next_discharge)
+        self.is_auto_analyzing = False
 
     def on_cell_clicked(self, row, col):
         if self.selected_channel:
@@ -1909,6 +1950,7 @@ class MainWindow(QMainWindow):
 
     def on_discharge_finder_finished(self, discharges):
         self.discharges = discharges
+        self.discharge_index = DischargeIndex(discharges, self.active_channels)
         for i in range(4):
             if self.plotted_channels[i] is not None:
                 for item in self.graph_widget.plot_widgets[i].items():
@@ -1932,28 +1974,29 @@ class MainWindow(QMainWindow):
             self.data[row - 1, col - 1]["SzTimes"] for row, col in self.active_channels
         ]
 
+    def get_discharge_index(self):
+        index = self.discharge_index
+        if (
+            index is None
+            or index.discharges is not self.discharges
+            or index.active_channels is not self.active_channels
+        ):
+            self.discharge_index = DischargeIndex(self.discharges, self.active_channels)
+        return self.discharge_index
+
     def handle_prop_lines(self, current_time):
         start, stop = self.custom_region
-        discharged_cells = []
-        for row, col in self.active_channels:
-            if (row - 1, col - 1) in self.discharges:
-                discharge_times, _ = self.discharges[(row - 1, col - 1)]
-                for discharge_time in discharge_times:
-                    if (
-                        start <= discharge_time <= stop
-                        and abs(discharge_time - current_time) < self.bin_size
-                    ):
-                        discharged_cells.append((row, col))
-                        break
+        discharged_cells = self.get_discharge_index().cells_near(
+            current_time, self.bin_size, start, stop
+        )
 
-            for item in self.centroids:
-                self.grid_widget.scene.removeItem(item)
-            self.centroids.clear()
+        for item in self.centroids:
+            self.grid_widget.scene.removeItem(item)
+        self.centroids.clear()
 
-        if discharged_cells:
-            X = np.array(discharged_cells)
-            db = DBSCAN(eps=self.eps, min_samples=self.min_samples).fit(X)
-            labels = db.labels_
+        if len(discharged_cells) > 0:
+            X = discharged_cells
+            labels = lattice_dbscan([X], self.eps, self.min_samples)[0]
 
             unique_labels = set(labels)
             centroids = []
@@ -2130,9 +2173,7 @@ class MainWindow(QMainWindow):
         for cell in top_cells:
             cell.setColor(QColor(0, 255, 0), 1, self.opacity)
 
-        db = DBSCAN(eps=self.eps, min_samples=self.min_samples).fit(points)
-
-        labels = db.labels_
+        labels = lattice_dbscan([points], self.eps, self.min_samples)[0]
         unique_labels = set(labels)
         if -1 in unique_labels:
             unique_labels.remove(-1)
@@ -2579,11 +2620,15 @@ class MainWindow(QMainWindow):
 
         self.create_grid()
         self.update_grid(first=True)
+        self.spike_detector.clear()
+        self.spectrogram_cache.clear()
+        self.graph_widget.clear_trace_caches()
         self.raster_plot = RasterPlot(
             self.data,
             self.sampling_rate,
             self.active_channels,
             self.raster_downsample_factor,
+            self.spike_detector,
         )
         self.raster_plot.generate_raster()
         self.raster_plot.create_raster_plot(self.second_plot_widget)
@@ -2838,6 +2883,7 @@ else:
     sys.exit(1)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     print("Hello! You are now on the development branch :D")
     app = QApplication(sys.argv)
     qdarktheme.setup_theme()
@@ -0,0 +1,27 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+class DischargeTrackingThread(QThread):
+    progress = pyqtSignal(int, int)
+    tracking_finished = pyqtSignal(object)
+
+    def __init__(self, discharge_tracker, discharge_times, start, stop):
+        super().__init__()
+        self.discharge_tracker = discharge_tracker
+        self.discharge_times = discharge_times
+        self.start_range = start
+        self.stop_range = stop
+
+    def run(self):
+        try:
+            seizures = self.discharge_tracker.track(
+                self.discharge_times,
+                self.start_range,
+                self.stop_range,
+                progress=self.progress.emit,
+                is_canceled=self.isInterruptionRequested,
+            )
+        except Exception as e:
+            print(f"Error tracking discharges: {e}")
+            seizures = None
+        self.tracking_finished.emit(seizures)
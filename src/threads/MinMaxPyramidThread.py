@@ -0,0 +1,17 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from helpers.MinMaxPyramid import MinMaxPyramid
+
+
+class MinMaxPyramidThread(QThread):
+    pyramid_ready = pyqtSignal(object, object)
+
+    def __init__(self, key, x, y):
+        super().__init__()
+        self.key = key
+        self.x = x
+        self.y = y
+
+    def run(self):
+        pyramid = MinMaxPyramid.from_xy(self.x, self.y)
+        self.pyramid_ready.emit(self.key, pyramid)
@@ -0,0 +1,37 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from helpers.SpectrogramCache import compute_spectrogram
+
+
+class SpectrogramThread(QThread):
+    spectrogram_ready = pyqtSignal(int, int, object, object)
+
+    def __init__(self, jobs, max_workers=None):
+        super().__init__()
+        # Each job is (plot_index, generation, cache_key, compute_spectrogram kwargs)
+        self.jobs = jobs
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                pool.submit(compute_spectrogram, **kwargs): (
+                    plot_index,
+                    generation,
+                    key,
+                )
+                for plot_index, generation, key, kwargs in self.jobs
+            }
+            for future in as_completed(futures):
+                if self.isInterruptionRequested():
+                    break
+                plot_index, generation, key = futures[future]
+                try:
+                    tile = future.result()
+                except Exception as e:
+                    print(f"Error computing spectrogram: {e}")
+                    continue
+                self.spectrogram_ready.emit(plot_index, generation, key, tile)
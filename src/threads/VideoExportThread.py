@@ -0,0 +1,135 @@
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+class VideoExportThread(QThread):
+    progress = pyqtSignal(int)
+    export_finished = pyqtSignal(bool, str, str)
+
+    def __init__(
+        self,
+        renderer,
+        segments,
+        output_path,
+        fps,
+        batch_size=16,
+        max_workers=None,
+        max_queued_batches=4,
+    ):
+        super().__init__()
+        self.renderer = renderer
+        self.output_path = output_path
+        self.fps = fps
+        self.batch_size = batch_size
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self.max_queued_batches = max_queued_batches
+        self.times = np.concatenate(
+            [np.arange(start, end, 1 / fps) for start, end in segments] + [[]]
+        )
+
+    def total_frames(self):
+        return len(self.times)
+
+    def render_batch(self, times):
+        return [
+            cv2.cvtColor(self.renderer.render(time), cv2.COLOR_RGB2BGR)
+            for time in times
+        ]
+
+    def write_frames(self, writer, frames):
+        frames_written = 0
+        try:
+            while True:
+                batch = frames.get()
+                if batch is None:
+                    return
+                for frame in batch:
+                    writer.write(frame)
+                frames_written += len(batch)
+                self.progress.emit(frames_written)
+        except Exception as e:
+            self.writer_error = e
+
+    def put_batch(self, frames, batch, writer_thread):
+        """Queue a batch for the writer, unless the writer has stopped."""
+        while writer_thread.is_alive():
+            try:
+                frames.put(batch, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self):
+        self.writer_error = None
+        try:
+            height, width, _ = self.renderer.render(0).shape
+            # Use H.264 codec with hardware acceleration if available
+            fourcc = cv2.VideoWriter_fourcc(*"avc1")
+            writer = cv2.VideoWriter(
+                self.output_path, fourcc, self.fps, (width, height)
+            )
+            if not writer.isOpened():
+                raise IOError(f"Could not open {self.output_path} for writing")
+        except Exception as e:
+            print(f"Error exporting video: {e}")
+            self.export_finished.emit(False, self.output_path, str(e))
+            return
+
+        # Rendered batches are handed to the encoder in order through a bounded
+        # queue, so rendering can run ahead of encoding without unbounded memory
+        frames = queue.Queue(maxsize=self.max_queued_batches)
+        writer_thread = threading.Thread(
+            target=self.write_frames, args=(writer, frames), daemon=True
+        )
+        writer_thread.start()
+
+        batches = [
+            self.times[i : i + self.batch_size]
+            for i in range(0, len(self.times), self.batch_size)
+        ]
+        error = ""
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                pending = deque()
+                next_batch = 0
+                while pending or next_batch < len(batches):
+                    while (
+                        next_batch < len(batches)
+                        and len(pending) < 2 * self.max_workers
+                    ):
+                        pending.append(
+                            pool.submit(self.render_batch, batches[next_batch])
+                        )
+                        next_batch += 1
+
+                    if self.isInterruptionRequested():
+                        for future in pending:
+                            future.cancel()
+                        break
+
+                    batch = pending.popleft().result()
+                    if not self.put_batch(frames, batch, writer_thread):
+                        for future in pending:
+                            future.cancel()
+                        break
+        except Exception as e:
+            print(f"Error exporting video: {e}")
+            error = str(e)
+        finally:
+            self.put_batch(frames, None, writer_thread)
+            writer_thread.join()
+            writer.release()
+
+        if not error and self.writer_error is not None:
+            print(f"Error writing video: {self.writer_error}")
+            error = str(self.writer_error)
+        completed = not error and not self.isInterruptionRequested()
+        self.export_finished.emit(completed, self.output_path, error)
@@ -1,4 +1,5 @@
 import math
+from collections import deque
 from multiprocessing import Pool
 import sys
 import os
@@ -36,11 +37,15 @@ import matplotlib.image as mpimg
 import qdarktheme
 import pywt
 import time
-from tqdm import tqdm
+
+from helpers.Decimation import PolyphaseDecimator
 
 
 SIZE = 30
 MARKER = "s"
+# Memory for the wavelet chunks being decoded at once, at float64
+WAV_DECODE_BYTES = 256 * 1024 * 1024
+RAW_CHUNK_BYTES = 1024 * 1024
 
 
 class ScatterPlot(QWidget):
@@ -203,67 +208,203 @@ class ScatterPlot(QWidget):
         QMessageBox.information(self, "Plot Hotkeys", "\n".join(hotkeys))
 
 
-def reconstruct_WAV_signal(
+def plan_WAV_decode(channel_indices, nChannels, coefsTotalLength, coefsChunkLength):
+    """Number of usable coefficient blocks for the selected channels."""
+    block_length = coefsChunkLength * nChannels
+    last_channel_end = (np.max(channel_indices) + 1) * coefsChunkLength
+    num_blocks = coefsTotalLength // block_length
+    # A trailing partial block is only usable if it holds every selected chunk
+    if coefsTotalLength - num_blocks * block_length >= last_channel_end:
+        num_blocks += 1
+    return num_blocks
+
+
+def WAV_read_span(channel_indices, nChannels, coefsChunkLength):
+    """Coefficient range of each block that holds the selected channels, and
+    whether a run of blocks is dense enough to read in one slice."""
+    span_start = np.min(channel_indices) * coefsChunkLength
+    span_stop = (np.max(channel_indices) + 1) * coefsChunkLength
+    contiguous = 2 * (span_stop - span_start) >= nChannels * coefsChunkLength
+    return span_start, span_stop, contiguous
+
+
+def decode_WAV_frames(
     recfileName,
-    channel_index,
-    samplingRate,
+    channel_indices,
     nChannels,
-    coefsTotalLength,
     compressionLevel,
-    framesChunkLength,
     coefsChunkLength,
+    block,
+    count,
 ):
-    data = []
-    with h5py.File(recfileName) as file:
-        coefs_position = channel_index * coefsChunkLength
-        while coefs_position < coefsTotalLength:
-            coefs = file["Well_A1/WaveletBasedEncodedRaw"][
-                coefs_position : coefs_position + coefsChunkLength
-            ]
-            length = int(len(coefs) / 2)
-
-            approx, details = coefs[:length], coefs[length:]
-            approx = np.roll(approx, -5)
-            details = np.roll(details, -5)
-
-            length = int(len(coefs) / 2)
-            frames = pywt.idwt(approx, details, "sym7", "periodization")
-            length *= 2
-            for i in range(1, compressionLevel):
-                frames = pywt.idwt(frames[:length], None, "sym7", "periodization")
-                length *= 2
-            data.extend(frames[2:-2])
-            coefs_position += coefsChunkLength * nChannels
-    return data
-
-
-def extract_channel(args):
-    (
-        i,
-        recfileName,
-        samplingRate,
-        nChannels,
-        coefsTotalLength,
-        compressionLevel,
-        framesChunkLength,
-        coefsChunkLength,
-        chfileInfo,
-    ) = args
-    channel_data = reconstruct_WAV_signal(
+    """Decode count blocks starting at block into a (channels, frames) array.
+
+    The coefficients are stored block by block with one chunk per channel in
+    each block, so a single contiguous read covers every selected channel of a
+    run of blocks and the inverse DWT runs on all of their chunks at once.
+    """
+    channel_indices = np.asarray(channel_indices)
+    block_length = coefsChunkLength * nChannels
+    span_start, span_stop, contiguous = WAV_read_span(
+        channel_indices, nChannels, coefsChunkLength
+    )
+    half = coefsChunkLength // 2
+    frames_per_chunk = coefsChunkLength * 2 ** (compressionLevel - 1) - 4
+
+    with h5py.File(recfileName, "r") as file:
+        dataset = file["Well_A1/WaveletBasedEncodedRaw"]
+        start = block * block_length
+        if contiguous:
+            coefs = np.zeros(count * block_length, dtype=dataset.dtype)
+            read = dataset[start : start + (count - 1) * block_length + span_stop]
+            coefs[: len(read)] = read
+            coefs = coefs.reshape(count, block_length)[:, span_start:span_stop]
+        else:
+            # Only the selected part of each block, so unselected channels are
+            # never read into memory
+            coefs = np.zeros((count, span_stop - span_start), dtype=dataset.dtype)
+            for i in range(count):
+                offset = start + i * block_length
+                read = dataset[offset + span_start : offset + span_stop]
+                coefs[i, : len(read)] = read
+    coefs = coefs.reshape(count, -1, coefsChunkLength)[
+        :, channel_indices - channel_indices.min()
+    ].reshape(-1, coefsChunkLength)
+
+    approx = np.roll(coefs[:, :half], -5, axis=1)
+    details = np.roll(coefs[:, half:], -5, axis=1)
+    frames = pywt.idwt(approx, details, "sym7", "periodization", axis=-1)
+    for i in range(1, compressionLevel):
+        frames = pywt.idwt(frames, None, "sym7", "periodization", axis=-1)
+
+    # (blocks * channels, frames) -> (channels, blocks * frames)
+    return (
+        frames[:, 2:-2]
+        .reshape(count, len(channel_indices), frames_per_chunk)
+        .transpose(1, 0, 2)
+        .reshape(len(channel_indices), -1)
+    )
+
+
+def decode_WAV_blocks(
+    recfileName,
+    channel_indices,
+    nChannels,
+    compressionLevel,
+    coefsChunkLength,
+    downsample_factor,
+    block,
+    count,
+    num_blocks,
+):
+    """Decode count blocks starting at block and decimate them into a float32
+    (channels, frames) array on the recording-wide downsample_factor grid.
+
+    The neighbouring blocks the anti-aliasing filter reaches into are decoded
+    too, so consecutive batches join without seams.
+    """
+    frames_per_chunk = coefsChunkLength * 2 ** (compressionLevel - 1) - 4
+    decimator = PolyphaseDecimator(downsample_factor, block * frames_per_chunk)
+    context = -(-decimator.delay // frames_per_chunk)
+    first = max(0, block - context)
+    last = min(num_blocks, block + count + context)
+    frames = decode_WAV_frames(
         recfileName,
-        i,
-        samplingRate,
+        channel_indices,
         nChannels,
-        coefsTotalLength,
         compressionLevel,
-        framesChunkLength,
         coefsChunkLength,
+        first,
+        last - first,
     )
-    original_sampling_rate = samplingRate
-    desired_sampling_rate = chfileInfo["newSampling"]
-    downsample_factor = math.floor(original_sampling_rate / desired_sampling_rate)
-    downsampled_channel_data = channel_data[::downsample_factor]
-    return downsampled_channel_data
+
+    start = (block - first) * frames_per_chunk
+    stop = start + count * frames_per_chunk
+    decimator.prime(frames[:, max(0, start - decimator.delay) : start])
+    decimated = decimator.process(frames[:, start : stop + decimator.delay])
+    if last == num_blocks:
+        decimated = np.concatenate(
+            (decimated, decimator.flush((block + count) * frames_per_chunk)), axis=1
+        )
+    return decimated.astype(np.float32)
+
+
+def stream_WAV_signals(
+    recfileName,
+    channel_indices,
+    nChannels,
+    coefsTotalLength,
+    compressionLevel,
+    coefsChunkLength,
+    downsample_factor=1,
+    processes=None,
+):
+    """Yield the selected channels of a BW5 wavelet recording, anti-aliased and
+    decimated, as float32 (channels, frames) blocks in recording order, decoded
+    by a process pool.
+
+    Only a few batches per worker are in flight at once, so memory stays
+    bounded no matter how long the recording is.
+    """
+    num_blocks = plan_WAV_decode(
+        channel_indices, nChannels, coefsTotalLength, coefsChunkLength
+    )
+    frames_per_chunk = coefsChunkLength * 2 ** (compressionLevel - 1) - 4
+    processes = max(1, min(processes or os.cpu_count() or 1, num_blocks))
+    span_start, span_stop, contiguous = WAV_read_span(
+        channel_indices, nChannels, coefsChunkLength
+    )
+    with h5py.File(recfileName, "r") as file:
+        itemsize = file["Well_A1/WaveletBasedEncodedRaw"].dtype.itemsize
+    # A batch holds the coefficients it reads and the frames it decodes
+    read_bytes = (
+        nChannels * coefsChunkLength if contiguous else span_stop - span_start
+    ) * itemsize
+    block_bytes = max(read_bytes, len(channel_indices) * frames_per_chunk * 8)
+    blocks_per_read = max(1, WAV_DECODE_BYTES // processes // block_bytes)
+    batches = [
+        (
+            recfileName,
+            channel_indices,
+            nChannels,
+            compressionLevel,
+            coefsChunkLength,
+            downsample_factor,
+            block,
+            min(blocks_per_read, num_blocks - block),
+            num_blocks,
+        )
+        for block in range(0, num_blocks, blocks_per_read)
+    ]
+
+    if processes == 1:
+        for batch in batches:
+            yield decode_WAV_blocks(*batch)
+        return
+
+    with Pool(processes) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.apply_async(decode_WAV_blocks, batch))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def WAV_output_frames(
+    channel_indices,
+    nChannels,
+    coefsTotalLength,
+    compressionLevel,
+    coefsChunkLength,
+    downsample_factor=1,
+):
+    num_blocks = plan_WAV_decode(
+        channel_indices, nChannels, coefsTotalLength, coefsChunkLength
+    )
+    frames_per_chunk = coefsChunkLength * 2 ** (compressionLevel - 1) - 4
+    return -(-num_blocks * frames_per_chunk // downsample_factor)
 
 
 def extBW5_WAV(chfileName, recfileName, chfileInfo, parameters):
@@ -321,54 +462,31 @@ def extBW5_WAV(chfileName, recfileName, chfileInfo, parameters):
 
     s = time.time()
 
-    args = [
-        (
-            i,
-            recfileName,
-            samplingRate,
-            nChannels,
-            coefsTotalLength,
-            compressionLevel,
-            framesChunkLength,
-            coefsChunkLength,
-            chfileInfo,
-        )
-        for i in idx_a
-    ]
-
-    with Pool() as pool:
-        results = list(
-            tqdm(
-                pool.map(extract_channel, args),
-                total=len(args),
-                desc="Extracting channels",
-            )
-        )
-
-    original_sampling_rate = parameters["samplingRate"]
+    original_sampling_rate = samplingRate
     desired_sampling_rate = chfileInfo["newSampling"]
     downsample_factor = math.floor(original_sampling_rate / desired_sampling_rate)
     new_sampling_rate = original_sampling_rate / downsample_factor
     print(f"Mine: {new_sampling_rate}")
     print(f"Original: {fs}")
 
-    chunk_size = 100000
-    nrecFrame = len(results[0])
-
-    for i in range(0, nrecFrame, chunk_size):
-        start = i
-        end = min(i + chunk_size, nrecFrame)
-
-        raw_chunk = [results[j][start:end] for j in range(len(results))]
-        raw_chunk = np.array(raw_chunk)
+    decode_args = (
+        idx_a,
+        nChannels,
+        coefsTotalLength,
+        compressionLevel,
+        coefsChunkLength,
+        downsample_factor,
+    )
+    nrecFrame = WAV_output_frames(*decode_args)
+    dset.createRaw(len(idx_a) * nrecFrame, len(idx_a))
+    dset.writeSamplingFreq(new_sampling_rate)
+    dset.witeFrames(nrecFrame)
+    dset.writeChs(newChs)
 
-        if i == 0:
-            dset.writeRaw(raw_chunk, typeFlatten="F")
-            dset.writeSamplingFreq(new_sampling_rate)
-            dset.witeFrames(nrecFrame)
-            dset.writeChs(newChs)
-        else:
-            dset.appendBrw(output_path, end, raw_chunk)
+    offset = 0
+    for block in stream_WAV_signals(recfileName, *decode_args):
+        dset.writeRawAt(offset, block, typeFlatten="F")
+        offset += block.size
 
     dset.close()
 
@@ -1307,6 +1425,24 @@ class writeBrw:
         else:
             self.newDataset.create_dataset("/3BData/Raw", data=newRaw, maxshape=(None,))
 
+    def createRaw(self, length, frameLength):
+        """Preallocate /3BData/Raw, chunked on whole frames of frameLength samples."""
+        chunkFrames = max(1, RAW_CHUNK_BYTES // (2 * max(1, frameLength)))
+        self.newDataset.create_dataset(
+            "/3BData/Raw",
+            shape=(length,),
+            dtype=np.int16,
+            chunks=(max(1, min(length, chunkFrames * frameLength)),),
+            maxshape=(None,),
+        )
+
+    def writeRawAt(self, offset, rawToWrite, typeFlatten="F"):
+        if rawToWrite.ndim == 1:
+            newRaw = rawToWrite
+        else:
+            newRaw = np.int16(rawToWrite.flatten(typeFlatten))
+        self.newDataset["3BData/Raw"][offset : offset + newRaw.shape[0]] = newRaw
+
     def writeChs(self, chs):
         self.newDataset.create_dataset("/3BRecInfo/3BMeaStreams/Raw/Chs", data=chs)
 
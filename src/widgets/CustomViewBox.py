@@ -21,6 +21,9 @@ class TraceViewBoxMenu(QMenu):
         clear_tracked_discharges_action = QAction("Clear tracked discharges", self)
         save_tracked_discharges_action = QAction("Save tracked discharges", self)
         export_discharge_stats_action = QAction("Export discharge stats", self)
+        export_discharge_parquet_action = QAction(
+            "Export discharge stats (Parquet)", self
+        )
         save_single_plot_action = QAction("Save this plot", self)
         save_all_plots_action = QAction("Save all plots", self)
         toggle_regions_action = QAction("Toggle regions", self)
@@ -41,7 +44,10 @@ class TraceViewBoxMenu(QMenu):
         clear_tracked_discharges_action.triggered.connect(self.clear_tracked_discharges)
         save_tracked_discharges_action.triggered.connect(self.save_tracked_discharges)
         export_discharge_stats_action.triggered.connect(
-            self.parent.main_window.export_discharge_stats
+            lambda: self.parent.main_window.export_discharge_stats("zip")
+        )
+        export_discharge_parquet_action.triggered.connect(
+            lambda: self.parent.main_window.export_discharge_stats("parquet")
         )
 
         save_single_plot_action.triggered.connect(self.save_single_plot.emit)
@@ -59,6 +65,7 @@ class TraceViewBoxMenu(QMenu):
         self.addAction(clear_tracked_discharges_action)
         self.addAction(save_tracked_discharges_action)
         self.addAction(export_discharge_stats_action)
+        self.addAction(export_discharge_parquet_action)
         self.addSeparator()
         self.addAction(save_single_plot_action)
         self.addAction(save_all_plots_action)
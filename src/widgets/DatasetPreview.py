@@ -0,0 +1,146 @@
+import math
+
+import numpy as np
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt5.QtWidgets import (
+    QDialog,
+    QHBoxLayout,
+    QLabel,
+    QPushButton,
+    QSpinBox,
+    QTableView,
+    QVBoxLayout,
+)
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PREVIEW_COLUMNS = 256
+
+
+class DatasetTableModel(QAbstractTableModel):
+    """One page of an HDF5 dataset's rows, read as a hyperslab when the page changes."""
+
+    def __init__(self, dataset, page_size=DEFAULT_PAGE_SIZE, parent=None):
+        super().__init__(parent)
+        self.dataset = dataset
+        self.page_size = page_size
+        self.page = 0
+        self.start = 0
+        self.block = None
+        self.load_page()
+
+    def total_rows(self):
+        return 1 if self.dataset.shape == () else self.dataset.shape[0]
+
+    def num_pages(self):
+        return max(1, math.ceil(self.total_rows() / self.page_size))
+
+    def load_page(self):
+        self.start = self.page * self.page_size
+        stop = self.start + self.page_size
+        if self.dataset.shape == ():
+            self.block = np.array([self.dataset[()]])
+        elif self.dataset.ndim == 1:
+            self.block = self.dataset[self.start : stop]
+        else:
+            self.block = self.dataset[self.start : stop, :MAX_PREVIEW_COLUMNS]
+
+    def set_page(self, page):
+        self.beginResetModel()
+        self.page = min(max(page, 0), self.num_pages() - 1)
+        self.load_page()
+        self.endResetModel()
+
+    def set_page_size(self, page_size):
+        # Keep the first row on screen in view
+        first_row = self.page * self.page_size
+        self.page_size = page_size
+        self.set_page(first_row // page_size)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.block)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        if self.block.dtype.names:
+            return len(self.block.dtype.names)
+        return 1 if self.block.ndim <= 1 else self.block.shape[1]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        row = self.block[index.row()]
+        if self.block.dtype.names:
+            value = row[self.block.dtype.names[index.column()]]
+        elif self.block.ndim <= 1:
+            value = row
+        else:
+            value = row[index.column()]
+        return str(value.tolist() if isinstance(value, np.ndarray) else value)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Vertical:
+            return str(self.start + section)
+        if self.block.dtype.names:
+            return self.block.dtype.names[section]
+        return "value" if self.block.ndim <= 1 else str(section)
+
+
+class DatasetPreviewDialog(QDialog):
+    def __init__(self, dataset, path, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Preview - {path}")
+        self.setMinimumSize(600, 400)
+        self.model = DatasetTableModel(dataset, parent=self)
+
+        layout = QVBoxLayout(self)
+        info_label = QLabel(f"Shape: {dataset.shape}, Type: {dataset.dtype}")
+        layout.addWidget(info_label)
+
+        self.table_view = QTableView()
+        self.table_view.setModel(self.model)
+        layout.addWidget(self.table_view)
+
+        nav_layout = QHBoxLayout()
+        layout.addLayout(nav_layout)
+
+        self.prev_button = QPushButton("Previous")
+        self.prev_button.clicked.connect(lambda: self.go_to_page(self.model.page - 1))
+        nav_layout.addWidget(self.prev_button)
+
+        self.page_label = QLabel()
+        nav_layout.addWidget(self.page_label)
+
+        self.next_button = QPushButton("Next")
+        self.next_button.clicked.connect(lambda: self.go_to_page(self.model.page + 1))
+        nav_layout.addWidget(self.next_button)
+
+        nav_layout.addStretch()
+        nav_layout.addWidget(QLabel("Rows per page:"))
+        self.page_size_box = QSpinBox()
+        self.page_size_box.setRange(10, 100000)
+        self.page_size_box.setSingleStep(100)
+        self.page_size_box.setValue(self.model.page_size)
+        self.page_size_box.editingFinished.connect(self.update_page_size)
+        nav_layout.addWidget(self.page_size_box)
+
+        self.update_navigation()
+
+    def go_to_page(self, page):
+        self.model.set_page(page)
+        self.update_navigation()
+
+    def update_page_size(self):
+        if self.page_size_box.value() == self.model.page_size:
+            return
+        self.model.set_page_size(self.page_size_box.value())
+        self.update_navigation()
+
+    def update_navigation(self):
+        self.page_label.setText(
+            f"Page {self.model.page + 1} of {self.model.num_pages()}"
+        )
+        self.prev_button.setEnabled(self.model.page > 0)
+        self.next_button.setEnabled(self.model.page < self.model.num_pages() - 1)
@@ -18,7 +18,7 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtCore import QEvent, QRectF, Qt
 import numpy as np
-from widgets.DischargeStartArea import DischargeStartArea
+from helpers.DischargeStartAreas import DischargeStartAreas
 import pyqtgraph as pg
 from matplotlib import cm
 
@@ -58,7 +58,7 @@ class DischargeStartDialog(QDialog):
         self.setMinimumSize(800, 500)
 
         self.current_time = None
-        self.discharge_start_areas: list[DischargeStartArea] = []
+        self.discharge_start_areas = DischargeStartAreas()
         self.discharge_start_items = []
         self.colormap = cm.get_cmap("cool")
 
@@ -226,29 +226,9 @@ class DischargeStartDialog(QDialog):
         try:
             with h5py.File(self.main_window.file_path, "r") as f:
                 if "discharge_start_areas" in f:
-                    areas_group = f["discharge_start_areas"]
-                    for id in areas_group:
-                        try:
-                            area_dataset = areas_group[id]
-                            timestamp = area_dataset.attrs["timestamp"]
-                            centroid_x = area_dataset.attrs["centroid_x"]
-                            centroid_y = area_dataset.attrs["centroid_y"]
-                            width = area_dataset.attrs["width"]
-                            height = area_dataset.attrs["height"]
-                            involved_channels = area_dataset.attrs["involved_channels"]
-                            self.discharge_start_areas.append(
-                                DischargeStartArea(
-                                    timestamp,
-                                    centroid_x,
-                                    centroid_y,
-                                    width,
-                                    height,
-                                    involved_channels,
-                                )
-                            )
-                        except Exception as e:
-                            print(f"Error loading discharge start area: {e}")
-                            continue
+                    self.discharge_start_areas = DischargeStartAreas.read_hdf5(
+                        f["discharge_start_areas"]
+                    )
             self.update_discharges()
         except Exception as e:
             msg = QMessageBox()
@@ -292,27 +272,7 @@ class DischargeStartDialog(QDialog):
             with h5py.File(self.main_window.file_path, "a") as f:
                 if "discharge_start_areas" not in f:
                     f.create_group("discharge_start_areas")
-                areas_group = f["discharge_start_areas"]
-                for discharge_start_area in self.discharge_start_areas:
-                    if discharge_start_area.id in areas_group:
-                        del areas_group[discharge_start_area.id]
-                    area_dataset = areas_group.create_dataset(
-                        discharge_start_area.id, data=[0], shape=(1,)
-                    )
-                    try:
-                        area_dataset.attrs["timestamp"] = discharge_start_area.timestamp
-                        area_dataset.attrs["centroid_x"] = discharge_start_area.x
-                        area_dataset.attrs["centroid_y"] = discharge_start_area.y
-                        area_dataset.attrs["width"] = discharge_start_area.width
-                        area_dataset.attrs["height"] = discharge_start_area.height
-                        area_dataset.attrs["involved_channels"] = [
-                            [cell.row, cell.col]
-                            for cell in discharge_start_area.involved_channels
-                        ]
-                    except Exception as e:
-                        del areas_group[discharge_start_area.id]
-                        print(f"Error saving discharge start area: {e}")
-                        continue
+                self.discharge_start_areas.write_hdf5(f["discharge_start_areas"])
         except Exception as e:
             msg = QMessageBox()
             msg.setIcon(QMessageBox.Critical)
@@ -357,19 +317,11 @@ class DischargeStartDialog(QDialog):
     def get_bin_data(self):
         num_bins = self.num_bins.value()
         bins_size = self.bins_size.value()
-        bin_data = []
-
-        for i in range(num_bins):
-            start_time = i * bins_size
-            end_time = (i + 1) * bins_size
-            discharge_count = sum(
-                1
-                for discharge in self.discharge_start_areas
-                if start_time <= discharge.timestamp < end_time
-            )
-            bin_data.append((start_time, end_time, discharge_count))
-
-        return bin_data
+        counts = self.discharge_start_areas.bin_counts(num_bins, bins_size)
+        return [
+            (i * bins_size, (i + 1) * bins_size, int(count))
+            for i, count in enumerate(counts)
+        ]
 
     def on_selection_changed(self):
         selected_rows = sorted(
@@ -395,14 +347,9 @@ class DischargeStartDialog(QDialog):
             bin_data = [data for data in bin_data if data[2] > 0]
 
         start_time, end_time, _ = bin_data[bin_index]
-        matching_discharges = [
-            discharge
-            for discharge in self.discharge_start_areas
-            if start_time <= discharge.timestamp < end_time
-        ]
-
-        for discharge in matching_discharges:
-            self.draw_discharge_point(scene, discharge, color)
+        areas = self.discharge_start_areas
+        for area in areas.table[areas.indices_between(start_time, end_time)]:
+            self.draw_discharge_point(scene, area, color)
 
     def draw_selected_bins(self, selected_rows, scene=False):
         if not scene:
@@ -421,31 +368,26 @@ class DischargeStartDialog(QDialog):
             else:
                 color = self.colormap(i / (len(selected_rows) - 1))
 
-            matching_discharges = [
-                discharge
-                for discharge in self.discharge_start_areas
-                if start_time <= discharge.timestamp < end_time
-            ]
+            areas = self.discharge_start_areas
+            for area in areas.table[areas.indices_between(start_time, end_time)]:
+                self.draw_discharge_point(scene, area, color)
 
-            for discharge in matching_discharges:
-                self.draw_discharge_point(scene, discharge, color)
-
-    def draw_discharge_point(self, scene, discharge, color):
+    def draw_discharge_point(self, scene, area, color):
         rgba_color = [int(c * 255) for c in color]
         if self.draw_areas_box.isChecked():
             gradient = QRadialGradient(
-                discharge.width / 2,
-                discharge.height / 2,
-                max(discharge.width, discharge.height) / 2,
+                area["width"] / 2,
+                area["height"] / 2,
+                max(area["width"], area["height"]) / 2,
             )
             gradient.setColorAt(0, QColor(*rgba_color[:3], int(255 * 0.05)))
             gradient.setColorAt(1, QColor(*rgba_color[:3], 0))
 
             discharge_area = TransparentEllipseItem(
-                discharge.x,
-                discharge.y,
-                discharge.width,
-                discharge.height,
+                area["centroid_x"],
+                area["centroid_y"],
+                area["width"],
+                area["height"],
                 QBrush(gradient),
             )
             scene.addItem(discharge_area)
@@ -453,8 +395,8 @@ class DischargeStartDialog(QDialog):
 
         if self.draw_points_box.isChecked():
             discharge_point = TransparentEllipseItem(
-                discharge.x,
-                discharge.y,
+                area["centroid_x"],
+                area["centroid_y"],
                 POINT_SIZE,
                 POINT_SIZE,
                 QBrush(QColor(*rgba_color)),
@@ -501,14 +443,12 @@ class DischargeStartDialog(QDialog):
         centroid_y = new_centroid[0] * highest_cell.rect().height()
 
         self.discharge_start_areas.append(
-            DischargeStartArea(
-                current_time,
-                centroid_x,
-                centroid_y,
-                width,
-                height,
-                involved_channels,
-            )
+            current_time,
+            centroid_x,
+            centroid_y,
+            width,
+            height,
+            [(cell.row, cell.col) for cell in involved_channels],
         )
         self.save_discharge_start_areas_to_hdf5()
 
@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from PyQt5.QtCore import QEvent, QTimer, pyqtSignal, Qt
 from PyQt5.QtWidgets import (
     QSizePolicy,
@@ -5,8 +6,9 @@ from PyQt5.QtWidgets import (
     QWidget,
 )
 import pyqtgraph as pg
-import numpy as np
 from helpers.Constants import SE, SEIZURE, STROKE_WIDTH, GRAPH_DOWNSAMPLE
+from helpers.MinMaxPyramid import minmax_decimate
+from threads.MinMaxPyramidThread import MinMaxPyramidThread
 from widgets.CustomViewBox import TraceViewBoxMenu
 
 failed_import = False
@@ -16,6 +18,19 @@ except ImportError:
     failed_import = True
 
 
+class LodPlotDataItem(pg.PlotDataItem):
+    # Holds only the on-screen slice of a trace, so report the full extent
+    # along x or auto-range would shrink to whatever is currently loaded
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.full_x_bounds = None
+
+    def dataBounds(self, ax, frac=1.0, orthoRange=None):
+        if ax == 0 and self.full_x_bounds is not None:
+            return self.full_x_bounds
+        return super().dataBounds(ax, frac, orthoRange)
+
+
 class GraphWidget(QWidget):
     region_clicked = pyqtSignal(float, float, int)
     save_single_plot = pyqtSignal()
@@ -36,6 +51,7 @@ class GraphWidget(QWidget):
         self.minimap.setMouseEnabled(x=False, y=False)
         self.minimap.setBackground("w")
         self.minimap_plot = self.minimap.plot(pen=pg.mkPen(color=(0, 0, 0), width=1))
+        self.minimap_plot.setDownsampling(auto=True, method="peak")
         self.minimap_region = pg.LinearRegionItem(
             values=(0, 1), movable=True, brush=(0, 0, 255, 50)
         )
@@ -66,9 +82,16 @@ class GraphWidget(QWidget):
         self.x_data = [None] * 4
         self.y_data = [None] * 4
         self.trace_curves = [None] * 4
+        self.trace_keys = [None] * 4
+        # A few recent channels' min/max pyramids, least recently used first
+        self.pyramids = OrderedDict()
+        self.max_cached_pyramids = 8
+        self.pyramid_threads = []
         self.active_plot_index = 0
         self.do_show_mini_map = True
         self.last_active_plot_index = -1
+        self.minimap_source = None
+        self.minimap_cache = {}
 
         self.temp_marker = None
         self.mouse_marker = None
@@ -111,6 +134,10 @@ class GraphWidget(QWidget):
                 )
             )
 
+            plot_widget.getPlotItem().getViewBox().sigXRangeChanged.connect(
+                lambda view_box, range_, i=i: self.update_lod_curve(i)
+            )
+
             plot_widget.scene().sigMouseMoved.connect(
                 lambda pos, i=i: self.update_active_plot(pos, i)
             )
@@ -305,25 +332,18 @@ class GraphWidget(QWidget):
             self.updating_from_plot = False
             return
 
-        # Only update the minimap data if the active plot has changed
-        if self.active_plot_index != self.last_active_plot_index:
-            downsampled_x, downsampled_y = self.downsample_data(
-                active_x_data, active_y_data, GRAPH_DOWNSAMPLE
-            )
-            curve = pg.PlotDataItem(
-                downsampled_x, downsampled_y, pen=pg.mkPen(color=(0, 0, 0), width=1)
+        # Only update the minimap data if the active plot's series has changed
+        if self.minimap_source is not active_y_data:
+            downsampled_x, downsampled_y = self.get_minimap_series(
+                self.active_plot_index
             )
-            curve.setDownsampling(auto=True, method="peak")
-
-            self.minimap.clear()
-            self.minimap.addItem(curve)
-            self.minimap.addItem(self.minimap_region)
-            self.minimap_plot = curve
+            self.minimap_plot.setData(downsampled_x, downsampled_y)
 
+            self.minimap_source = active_y_data
             self.last_active_plot_index = self.active_plot_index
             if len(active_x_data) > 0:
                 self.minimap.getPlotItem().getViewBox().setLimits(
-                    xMin=0, xMax=max(active_x_data)
+                    xMin=0, xMax=active_x_data[-1]
                 )
 
         # Always update the region
@@ -424,17 +444,28 @@ class GraphWidget(QWidget):
                 if isinstance(item, pg.LinearRegionItem):
                     item.hide()
 
-    def plot(self, x, y, title, xlabel, ylabel, plot_index, shape, seizures, se):
+    def plot(
+        self,
+        x,
+        y,
+        title,
+        xlabel,
+        ylabel,
+        plot_index,
+        shape,
+        seizures,
+        se,
+        channel=None,
+    ):
         self.plot_widgets[plot_index].clear()
         self.x_data[plot_index] = x
         self.y_data[plot_index] = y
+        self.trace_keys[plot_index] = channel
         seizure_regions, se_regions = self.get_regions(seizures, se)
 
-        curve = self.plot_widgets[plot_index].plot(pen=pg.mkPen("k", width=3))
-        curve.setData(x, y)
-        curve.setDownsampling(auto=True, method="peak", ds=100)
-        curve.setClipToView(True)
-        self.trace_curves[plot_index] = curve
+        self.create_trace_curve(plot_index)
+        if channel is not None and len(x) > 1:
+            self.request_pyramid(plot_index)
 
         self.plot_widgets[plot_index].addItem(self.red_lines[plot_index])
 
@@ -511,9 +542,94 @@ class GraphWidget(QWidget):
         if plot_index == 0:
             self.update_minimap()
 
+    def create_trace_curve(self, plot_index):
+        curve = LodPlotDataItem(pen=pg.mkPen("k", width=3))
+        self.plot_widgets[plot_index].addItem(curve)
+        self.trace_curves[plot_index] = curve
+        if self.get_pyramid(plot_index) is not None:
+            self.update_lod_curve(plot_index)
+        else:
+            curve.setData(self.x_data[plot_index], self.y_data[plot_index])
+            curve.setDownsampling(auto=True, method="peak", ds=100)
+            curve.setClipToView(True)
+        return curve
+
+    def get_pyramid(self, plot_index):
+        x, y = self.x_data[plot_index], self.y_data[plot_index]
+        key = self.trace_keys[plot_index]
+        pyramid = self.pyramids.get(key)
+        if pyramid is not None:
+            self.pyramids.move_to_end(key)
+        if pyramid is None or x is None or y is None or not pyramid.matches(x, y):
+            return None
+        return pyramid
+
+    def request_pyramid(self, plot_index):
+        """Build the channel's min/max pyramid off the UI thread unless it is cached."""
+        if self.get_pyramid(plot_index) is not None:
+            return
+        key = self.trace_keys[plot_index]
+        if any(thread.key == key for thread in self.pyramid_threads):
+            return
+
+        thread = MinMaxPyramidThread(
+            key, self.x_data[plot_index], self.y_data[plot_index]
+        )
+        thread.pyramid_ready.connect(self.on_pyramid_ready)
+        thread.finished.connect(lambda: self.pyramid_threads.remove(thread))
+        self.pyramid_threads.append(thread)
+        thread.start()
+
+    def on_pyramid_ready(self, key, pyramid):
+        self.pyramids[key] = pyramid
+        self.pyramids.move_to_end(key)
+        while len(self.pyramids) > self.max_cached_pyramids:
+            self.pyramids.popitem(last=False)
+        for i in range(4):
+            curve = self.trace_curves[i]
+            if self.trace_keys[i] != key or curve is None:
+                continue
+            if self.get_pyramid(i) is None:
+                continue
+            # The pyramid already hands over a screen-sized series
+            curve.setDownsampling(auto=False)
+            curve.setClipToView(False)
+            self.update_lod_curve(i)
+
+    def clear_trace_caches(self):
+        self.pyramids.clear()
+        self.minimap_cache.clear()
+        self.minimap_source = None
+
+    def update_lod_curve(self, plot_index):
+        curve = self.trace_curves[plot_index]
+        pyramid = self.get_pyramid(plot_index)
+        if curve is None or pyramid is None:
+            return
+
+        view_box = self.plot_widgets[plot_index].getPlotItem().getViewBox()
+        x_min, x_max = view_box.viewRange()[0]
+        max_points = max(1000, 2 * int(view_box.width()))
+        x, y = pyramid.query(x_min, x_max, max_points)
+        curve.full_x_bounds = pyramid.x_bounds()
+        curve.setData(x, y)
+
     def get_num_points(self, plot_index):
         return len(self.x_data[plot_index])
 
+    def get_minimap_series(self, plot_index):
+        x, y = self.x_data[plot_index], self.y_data[plot_index]
+        key = self.trace_keys[plot_index]
+        if key is None:
+            return self.downsample_data(x, y, GRAPH_DOWNSAMPLE)
+
+        cache_key = (key, len(y))
+        if cache_key not in self.minimap_cache:
+            self.minimap_cache[cache_key] = self.downsample_data(
+                x, y, GRAPH_DOWNSAMPLE
+            )
+        return self.minimap_cache[cache_key]
+
     def downsample_data(self, x, y, num_points):
         if x is None or y is None:
             return [], []
@@ -523,8 +639,7 @@ class GraphWidget(QWidget):
         if not failed_import:
             downsample_x, downsample_y = lttbc.downsample(x, y, num_points)
         else:
-            downsample_x = np.linspace(x[0], x[-1], num_points)
-            downsample_y = np.interp(downsample_x, x, y)
+            downsample_x, downsample_y = minmax_decimate(x, y, num_points)
 
         return downsample_x, downsample_y
 
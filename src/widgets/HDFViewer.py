@@ -13,143 +13,213 @@ from PyQt5.QtWidgets import (
     QPushButton,
     QHBoxLayout,
     QApplication,
+    QFileDialog,
+    QProgressDialog,
     QShortcut,
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import QModelIndex, Qt
 from PyQt5.QtGui import QStandardItemModel, QStandardItem, QKeySequence
 import numpy as np
 from collections import deque
 
+from helpers.DatasetStream import CLIPBOARD_MAX_ELEMENTS, export_dataset
+from helpers.UndoJournal import JOURNAL_GROUP, UndoJournal
+from widgets.DatasetPreview import DatasetPreviewDialog
+
+FETCH_BATCH_SIZE = 500
+UNDO_LIMIT = 100
+
 
 class DeleteOperation:
-    def __init__(self, path, item_type, value, parent_path=None, attributes=None):
+    # value is the attribute's value, or where the journal parked a dataset/group
+    def __init__(self, path, item_type, value, parent_path=None):
         self.path = path
         self.item_type = item_type
         self.value = value
         self.parent_path = parent_path
-        self.attributes = attributes or {}
 
 
 class HDF5TreeModel(QStandardItemModel):
+    """Tree of an open HDF5 file whose children are read when a node is expanded.
+
+    Nodes carry their path in Qt.UserRole and kind in Qt.UserRole + 1. Unread
+    nodes have Qt.UserRole + 2 set to False, and Qt.UserRole + 3 says whether
+    they have anything to show once read.
+    """
+
     def __init__(self, data, parent=None):
         super().__init__(parent)
+        self.hdf5 = data
+        # Names still to be read from partially fetched large groups, by path
+        self.pending = {}
         self.root_item = self.invisibleRootItem()
-        self.setup_model_data(data, self.root_item)
-
-    def setup_model_data(self, hdf5_file, parent_item, path="/"):
+        self.root_item.setData("/", Qt.UserRole)
+        self.root_item.setData("group", Qt.UserRole + 1)
+        self.root_item.setData(False, Qt.UserRole + 2)
+        self.root_item.setData(True, Qt.UserRole + 3)
+        self.fetch_children(self.root_item)
+
+    def item_for(self, index):
+        return self.itemFromIndex(index) if index.isValid() else self.root_item
+
+    def hasChildren(self, parent=QModelIndex()):
+        item = self.item_for(parent)
+        if item.data(Qt.UserRole + 2) is False:
+            return bool(item.data(Qt.UserRole + 3))
+        return super().hasChildren(parent)
+
+    def canFetchMore(self, parent):
+        item = self.item_for(parent)
+        return item.data(Qt.UserRole + 2) is False and bool(item.data(Qt.UserRole + 3))
+
+    def fetchMore(self, parent):
+        self.fetch_children(self.item_for(parent))
+
+    def create_node(self, path, item):
+        node = QStandardItem(path.rsplit("/", 1)[-1])
+        node.setData(path, Qt.UserRole)
+        if isinstance(item, h5py.Group):
+            node.setData("group", Qt.UserRole + 1)
+            node.setData(len(item) > 0 or len(item.attrs) > 0, Qt.UserRole + 3)
+        else:  # Dataset
+            node.setData("dataset", Qt.UserRole + 1)
+            node.setData(True, Qt.UserRole + 3)
+        node.setData(False, Qt.UserRole + 2)
+        return node
+
+    def create_attributes_node(self, path):
+        attrs_node = QStandardItem("Attributes")
+        attrs_node.setData(f"{path}/@".replace("//", "/"), Qt.UserRole)
+        attrs_node.setData("attributes", Qt.UserRole + 1)
+        attrs_node.setData(False, Qt.UserRole + 2)
+        attrs_node.setData(True, Qt.UserRole + 3)
+        return attrs_node
+
+    def create_attribute_item(self, path, attr_name, attr_value):
+        attr_item = QStandardItem(f"{attr_name}: {attr_value}")
+        attr_item.setData(f"{path}/@{attr_name}".replace("//", "/"), Qt.UserRole)
+        attr_item.setData("attribute", Qt.UserRole + 1)
+        return attr_item
+
+    def fetch_children(self, node):
+        path = node.data(Qt.UserRole)
+        item_type = node.data(Qt.UserRole + 1)
         try:
-            # Iterate through groups
-            for name, item in hdf5_file[path].items():
-                current_path = f"{path}/{name}".replace("//", "/")
-                node = QStandardItem(name)
-                node.setData(current_path, Qt.UserRole)
-
-                if isinstance(item, h5py.Group):
-                    node.setData("group", Qt.UserRole + 1)
-                    self.setup_model_data(hdf5_file, node, current_path)
-                else:  # Dataset
-                    node.setData("dataset", Qt.UserRole + 1)
-                    shape_str = str(item.shape) if hasattr(item, "shape") else ""
-                    dtype_str = str(item.dtype) if hasattr(item, "dtype") else ""
-                    info_item = QStandardItem(f"Shape: {shape_str}, Type: {dtype_str}")
-                    node.appendRow(info_item)
-
-                # Add attributes if any
-                if hasattr(item, "attrs"):
-                    attrs_node = QStandardItem("Attributes")
-                    for attr_name, attr_value in item.attrs.items():
-                        attr_item = QStandardItem(f"{attr_name}: {attr_value}")
-                        attr_item.setData(f"{current_path}/@{attr_name}", Qt.UserRole)
-                        attr_item.setData("attribute", Qt.UserRole + 1)
-                        attrs_node.appendRow(attr_item)
-                    node.appendRow(attrs_node)
+            if item_type == "attributes":
+                owner_path = path[:-2] or "/"
+                node.appendRows(
+                    [
+                        self.create_attribute_item(owner_path, attr_name, attr_value)
+                        for attr_name, attr_value in self.hdf5[owner_path].attrs.items()
+                    ]
+                )
+                node.setData(True, Qt.UserRole + 2)
+                return
 
-                parent_item.appendRow(node)
+            item = self.hdf5[path]
+            if item_type == "dataset":
+                shape_str = str(item.shape) if hasattr(item, "shape") else ""
+                dtype_str = str(item.dtype) if hasattr(item, "dtype") else ""
+                node.appendRow(QStandardItem(f"Shape: {shape_str}, Type: {dtype_str}"))
+            else:
+                # Large groups are read a batch at a time as the view scrolls
+                names = self.pending.setdefault(path, deque(item.keys()))
+                children = []
+                while names and len(children) < FETCH_BATCH_SIZE:
+                    name = names.popleft()
+                    child_path = f"{path}/{name}".replace("//", "/")
+                    if child_path == JOURNAL_GROUP:
+                        continue
+                    child = item.get(name)
+                    if child is not None:
+                        children.append(self.create_node(child_path, child))
+                node.appendRows(children)
+                if names:
+                    return
+                del self.pending[path]
+
+            if len(item.attrs) > 0:
+                node.appendRow(self.create_attributes_node(path))
+            node.setData(True, Qt.UserRole + 2)
         except Exception as e:
             print(f"Error loading HDF5 data: {e}")
+            node.setData(True, Qt.UserRole + 2)
 
     def remove_item(self, index):
         """Remove an item from the model without reloading the entire tree."""
         if index.isValid():
+            path = self.itemFromIndex(index).data(Qt.UserRole)
+            for pending_path in list(self.pending):
+                if pending_path == path or pending_path.startswith(f"{path}/"):
+                    del self.pending[pending_path]
             parent = index.parent()
             self.removeRow(index.row(), parent)
 
     def insert_item(self, path, item_type, parent_path=None):
-        """Insert an item back into the tree model with full data."""
+        """Show an item that was restored in the file, if its parent has been read."""
         try:
-            parts = path.split("/")
-            name = parts[-1]
-
-            # Find the parent item
-            if parent_path:
-                parent_item = self.find_item_by_path(parent_path)
-            else:
-                parent_item = self.invisibleRootItem()
-
-            if parent_item:
-                node = QStandardItem(name)
-                node.setData(path, Qt.UserRole)
-                node.setData(item_type, Qt.UserRole + 1)
-
-                # Add additional info based on type
-                if item_type == "dataset":
-                    item = self.hdf5[path]
-                    shape_str = str(item.shape) if hasattr(item, "shape") else ""
-                    dtype_str = str(item.dtype) if hasattr(item, "dtype") else ""
-                    info_item = QStandardItem(f"Shape: {shape_str}, Type: {dtype_str}")
-                    node.appendRow(info_item)
-
-                    # Add attributes
-                    if hasattr(item, "attrs") and len(item.attrs) > 0:
-                        attrs_node = QStandardItem("Attributes")
-                        for attr_name, attr_value in item.attrs.items():
-                            attr_item = QStandardItem(f"{attr_name}: {attr_value}")
-                            attr_item.setData(f"{path}/@{attr_name}", Qt.UserRole)
-                            attr_item.setData("attribute", Qt.UserRole + 1)
-                            attrs_node.appendRow(attr_item)
-                        node.appendRow(attrs_node)
-
-                elif item_type == "group":
-                    item = self.hdf5[path]
-                    # Recursively add group contents
-                    for child_name, child_item in item.items():
-                        child_path = f"{path}/{child_name}"
-                        child_type = (
-                            "group" if isinstance(child_item, h5py.Group) else "dataset"
-                        )
-                        self.setup_model_data(self.hdf5, node, path)
-
-                    # Add attributes
-                    if hasattr(item, "attrs") and len(item.attrs) > 0:
-                        attrs_node = QStandardItem("Attributes")
-                        for attr_name, attr_value in item.attrs.items():
-                            attr_item = QStandardItem(f"{attr_name}: {attr_value}")
-                            attr_item.setData(f"{path}/@{attr_name}", Qt.UserRole)
-                            attr_item.setData("attribute", Qt.UserRole + 1)
-                            attrs_node.appendRow(attr_item)
-                        node.appendRow(attrs_node)
-
+            parent_item = (
+                self.find_item_by_path(parent_path) if parent_path else self.root_item
+            )
+            if parent_item is None:
+                return None
+
+            name = path.rsplit("/", 1)[-1]
+            pending = self.pending.get(parent_item.data(Qt.UserRole))
+            if parent_item.data(Qt.UserRole + 2) is False and (
+                item_type == "attribute" or pending is None or name in pending
+            ):
+                # Not read yet (or not this far), so it will be picked up then
+                parent_item.setData(True, Qt.UserRole + 3)
+                return None
+
+            if item_type == "attribute":
+                owner_path, attr_name = path.split("@")
+                owner_path = owner_path.rstrip("/") or "/"
+                node = self.create_attribute_item(
+                    owner_path, attr_name, self.hdf5[owner_path].attrs[attr_name]
+                )
                 parent_item.appendRow(node)
                 return node
+
+            node = self.create_node(path, self.hdf5[path])
+            row = 0
+            while (
+                row < parent_item.rowCount()
+                and parent_item.child(row).data(Qt.UserRole + 1) != "attributes"
+                and parent_item.child(row).text() < name
+            ):
+                row += 1
+            parent_item.insertRow(row, node)
+            return node
         except Exception as e:
             print(f"Error inserting item: {e}")
         return None
 
     def find_item_by_path(self, path):
-        """Find an item in the tree model by its path."""
-
-        def search_recursive(parent_item):
-            for row in range(parent_item.rowCount()):
-                current_item = parent_item.child(row)
-                if current_item.data(Qt.UserRole) == path:
-                    return current_item
-                if current_item.hasChildren():
-                    result = search_recursive(current_item)
-                    if result:
-                        return result
+        """Find an item among the nodes read so far by its path."""
+        if path.endswith("@"):
+            owner = self.find_item_by_path(path[:-2] or "/")
+            if owner is None:
+                return None
+            for row in range(owner.rowCount()):
+                if owner.child(row).data(Qt.UserRole + 1) == "attributes":
+                    return owner.child(row)
             return None
 
-        return search_recursive(self.invisibleRootItem())
+        current_item = self.root_item
+        for name in filter(None, path.split("/")):
+            for row in range(current_item.rowCount()):
+                child = current_item.child(row)
+                if child.text() == name and child.data(Qt.UserRole + 1) in (
+                    "group",
+                    "dataset",
+                ):
+                    current_item = child
+                    break
+            else:
+                return None
+        return current_item
 
 
 class HDF5Viewer(QMainWindow):
@@ -163,7 +233,8 @@ class HDF5Viewer(QMainWindow):
         self.tree_model = None
         self.tree_view = None
         self.read_only = False
-        self.undo_stack = deque(maxlen=100)  # Store up to 100 operations
+        self.undo_stack = deque()  # Store up to UNDO_LIMIT operations
+        self.journal = None
         self.setup_ui()
         self.load_hdf5()
 
@@ -184,7 +255,7 @@ class HDF5Viewer(QMainWindow):
         toolbar_layout.addWidget(self.mode_button)
 
         refresh_button = QPushButton("Refresh")
-        refresh_button.clicked.connect(self.load_hdf5)
+        refresh_button.clicked.connect(self.refresh_tree)
         toolbar_layout.addWidget(refresh_button)
 
         self.undo_button = QPushButton("Undo")
@@ -193,7 +264,9 @@ class HDF5Viewer(QMainWindow):
         toolbar_layout.addWidget(self.undo_button)
 
         self.export_button = QPushButton("Export Discharge Stats")
-        self.export_button.clicked.connect(self.main_window.export_discharge_stats)
+        self.export_button.clicked.connect(
+            lambda: self.main_window.export_discharge_stats("zip")
+        )
         toolbar_layout.addWidget(self.export_button)
 
         toolbar_layout.addStretch()
@@ -211,78 +284,20 @@ class HDF5Viewer(QMainWindow):
         menubar.addMenu(file_menu)
 
         refresh_action = QAction("Refresh", self)
-        refresh_action.triggered.connect(self.load_hdf5)
+        refresh_action.triggered.connect(self.refresh_tree)
         file_menu.addAction(refresh_action)
 
         # Add Ctrl+Z shortcut
         self.undo_shortcut = QShortcut(QKeySequence("Ctrl+Z"), self)
         self.undo_shortcut.activated.connect(self.undo_last_deletion)
 
-    def get_item_attributes(self, item):
-        """Get all attributes of an HDF5 item."""
-        if hasattr(item, "attrs"):
-            return dict(item.attrs)
-        return {}
-
-    def store_delete_operation(self, path, item_type, parent_path=None):
-        """Store information about the deleted item for potential undo."""
-        try:
-            if item_type == "dataset":
-                value = np.array(self.hdf5[path])
-                attributes = self.get_item_attributes(self.hdf5[path])
-            elif item_type == "attribute":
-                group_path, attr_name = path.split("@")
-                value = self.hdf5[group_path].attrs[attr_name]
-                attributes = {}
-            elif item_type == "group":
-                # For groups, we need to store all nested items
-                value = self.store_group_structure(self.hdf5[path])
-                attributes = self.get_item_attributes(self.hdf5[path])
-
-            operation = DeleteOperation(path, item_type, value, parent_path, attributes)
-            self.undo_stack.append(operation)
-            self.undo_button.setEnabled(True)
-
-        except Exception as e:
-            print(f"Error storing delete operation: {e}")
-
-    def store_group_structure(self, group):
-        """Recursively store the structure and content of a group."""
-        structure = {}
-        for name, item in group.items():
-            if isinstance(item, h5py.Group):
-                structure[name] = {
-                    "type": "group",
-                    "attributes": dict(item.attrs),
-                    "content": self.store_group_structure(item),
-                }
-            else:  # Dataset
-                structure[name] = {
-                    "type": "dataset",
-                    "value": np.array(item),
-                    "attributes": dict(item.attrs),
-                }
-        return structure
-
-    def restore_group_structure(self, path, structure):
-        """Recursively restore a group structure."""
-        try:
-            group = self.hdf5.create_group(path)
-            for name, item in structure.items():
-                item_path = f"{path}/{name}"
-                if item["type"] == "group":
-                    self.restore_group_structure(item_path, item["content"])
-                else:  # Dataset
-                    dataset = self.hdf5.create_dataset(item_path, data=item["value"])
-                    for attr_name, attr_value in item["attributes"].items():
-                        dataset.attrs[attr_name] = attr_value
-
-            # Restore group attributes
-            for attr_name, attr_value in structure.get("attributes", {}).items():
-                group.attrs[attr_name] = attr_value
-
-        except Exception as e:
-            print(f"Error restoring group structure: {e}")
+    def push_undo(self, operation):
+        if len(self.undo_stack) >= UNDO_LIMIT:
+            oldest = self.undo_stack.popleft()
+            if oldest.item_type != "attribute":
+                self.journal.discard(oldest.value)
+        self.undo_stack.append(operation)
+        self.undo_button.setEnabled(True)
 
     def undo_last_deletion(self):
         """Undo the last deletion operation."""
@@ -292,20 +307,15 @@ class HDF5Viewer(QMainWindow):
         try:
             operation = self.undo_stack.pop()
 
-            if operation.item_type == "dataset":
-                dataset = self.hdf5.create_dataset(operation.path, data=operation.value)
-                for attr_name, attr_value in operation.attributes.items():
-                    dataset.attrs[attr_name] = attr_value
-
-            elif operation.item_type == "attribute":
+            if operation.item_type == "attribute":
                 group_path, attr_name = operation.path.split("@")
                 self.hdf5[group_path].attrs[attr_name] = operation.value
+            else:
+                self.journal.restore(operation.value, operation.path)
 
-            elif operation.item_type == "group":
-                self.restore_group_structure(operation.path, operation.value)
-
-            # Refresh the tree view
-            self.load_hdf5()
+            self.tree_model.insert_item(
+                operation.path, operation.item_type, operation.parent_path
+            )
 
             if not self.undo_stack:
                 self.undo_button.setEnabled(False)
@@ -330,6 +340,18 @@ class HDF5Viewer(QMainWindow):
 
     def copy_to_clipboard(self, path, item_type):
         """Copy the value to clipboard."""
+        if (
+            item_type == "dataset"
+            and self.hdf5[path].size is not None
+            and self.hdf5[path].size > CLIPBOARD_MAX_ELEMENTS
+        ):
+            QMessageBox.warning(
+                self,
+                "Warning",
+                f"{path} has {self.hdf5[path].size:,} values, too many to copy. "
+                "Use Export Dataset instead.",
+            )
+            return
         value = self.get_item_value(path, item_type)
         if value is not None:
             clipboard = QApplication.clipboard()
@@ -359,6 +381,15 @@ class HDF5Viewer(QMainWindow):
         )
         menu.addAction(copy_action)
 
+        if item_type == "dataset":
+            preview_action = QAction("Preview", self)
+            preview_action.triggered.connect(lambda: self.preview_dataset(item_path))
+            menu.addAction(preview_action)
+
+            export_action = QAction("Export Dataset...", self)
+            export_action.triggered.connect(lambda: self.export_dataset(item_path))
+            menu.addAction(export_action)
+
         if not self.read_only:
             menu.addSeparator()
             delete_action = QAction("Delete", self)
@@ -369,6 +400,47 @@ class HDF5Viewer(QMainWindow):
 
         menu.exec_(self.tree_view.viewport().mapToGlobal(position))
 
+    def preview_dataset(self, path):
+        try:
+            dialog = DatasetPreviewDialog(self.hdf5[path], path, self)
+            dialog.setAttribute(Qt.WA_DeleteOnClose)
+            dialog.show()
+        except Exception as e:
+            QMessageBox.warning(self, "Warning", f"Failed to preview: {str(e)}")
+
+    def export_dataset(self, path):
+        """Write a dataset to CSV or NPY a block of rows at a time."""
+        dataset = self.hdf5[path]
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Export Dataset",
+            f"{path.rsplit('/', 1)[-1]}.csv",
+            "CSV Files (*.csv);;NumPy Files (*.npy)",
+        )
+        if not file_path:
+            return
+
+        total_rows = dataset.shape[0] if dataset.shape else 1
+        progress_dialog = QProgressDialog(
+            f"Exporting {path}...", "Cancel", 0, total_rows, self
+        )
+        progress_dialog.setWindowModality(Qt.WindowModal)
+
+        def progress(rows_written):
+            progress_dialog.setValue(rows_written)
+            QApplication.processEvents()
+            if progress_dialog.wasCanceled():
+                raise InterruptedError("Export canceled")
+
+        try:
+            export_dataset(dataset, file_path, progress=progress)
+        except InterruptedError:
+            Path(file_path).unlink(missing_ok=True)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to export {path}: {str(e)}")
+        finally:
+            progress_dialog.close()
+
     def delete_item(self, path, item_type, index):
         """Delete an item and update the tree view without reloading."""
         if self.read_only:
@@ -376,24 +448,22 @@ class HDF5Viewer(QMainWindow):
             return
 
         try:
-            # Store the delete operation before actually deleting
             parent_index = index.parent()
             parent_path = (
                 self.tree_model.itemFromIndex(parent_index).data(Qt.UserRole)
                 if parent_index.isValid()
                 else None
             )
-            self.store_delete_operation(path, item_type, parent_path)
 
-            # Perform the deletion
-            if item_type == "dataset":
-                del self.hdf5[path]
-            elif item_type == "attribute":
+            if item_type == "attribute":
                 group_path, attr_name = path.split("@")
+                value = self.hdf5[group_path].attrs[attr_name]
                 del self.hdf5[group_path].attrs[attr_name]
-            elif item_type == "group":
-                del self.hdf5[path]
+            else:
+                # Moved aside rather than copied, so undo is just a move back
+                value = self.journal.stage(path)
 
+            self.push_undo(DeleteOperation(path, item_type, value, parent_path))
             self.tree_model.remove_item(index)
 
         except Exception as e:
@@ -402,23 +472,56 @@ class HDF5Viewer(QMainWindow):
             )
 
     def toggle_mode(self):
+        if not self.read_only and self.undo_stack:
+            response = QMessageBox.question(
+                self,
+                "Discard Undo History",
+                f"Switching to read-only mode permanently deletes "
+                f"{len(self.undo_stack)} item(s) that could still be undone. "
+                "Continue?",
+                QMessageBox.Yes | QMessageBox.No,
+            )
+            if response != QMessageBox.Yes:
+                return
         self.read_only = not self.read_only
         self.mode_button.setText(
             f"Mode: {'Read-Only' if self.read_only else 'Read-Write'}"
         )
         self.load_hdf5()
 
+    def refresh_tree(self):
+        """Rebuild the tree from the open file, keeping the undo history."""
+        if self.hdf5 is None or not self.hdf5.id.valid:
+            self.load_hdf5()
+            return
+        self.tree_model = HDF5TreeModel(self.hdf5)
+        self.tree_view.setModel(self.tree_model)
+        self.tree_view.collapseAll()
+
+    def close_hdf5(self):
+        """Close the file, first unlinking staged deletions if it is writable."""
+        if self.hdf5 is None:
+            return
+        try:
+            if self.hdf5.mode == "r+":
+                self.journal.commit()
+                self.undo_stack.clear()
+                self.undo_button.setEnabled(False)
+            self.hdf5.close()
+        except:
+            pass
+
     def load_hdf5(self, retries=3, delay=1):
-        if self.hdf5 is not None:
-            try:
-                self.hdf5.close()
-            except:
-                pass
+        self.close_hdf5()
 
         for attempt in range(retries):
             try:
                 mode = "r" if self.read_only else "r+"
                 self.hdf5 = h5py.File(self.file_path, mode)
+                self.journal = UndoJournal(self.hdf5)
+                if not self.read_only:
+                    # Left over from a session that was not closed cleanly
+                    self.journal.commit()
 
                 self.tree_model = HDF5TreeModel(self.hdf5)
                 self.tree_view.setModel(self.tree_model)
@@ -464,11 +567,7 @@ class HDF5Viewer(QMainWindow):
                 break
 
     def closeEvent(self, event):
-        if self.hdf5 is not None:
-            try:
-                self.hdf5.close()
-            except:
-                pass
+        self.close_hdf5()
         # Emit the destroyed signal before accepting the event
         self.destroyed.emit()
         event.accept()
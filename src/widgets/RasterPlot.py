@@ -2,22 +2,35 @@ import colorsys
 import numpy as np
 import pyqtgraph as pg
 import pyqtgraph.exporters
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import QRectF, Qt
 from PyQt5.QtGui import QColor, QFont
 from PyQt5.QtWidgets import QFileDialog, QGraphicsDropShadowEffect, QMessageBox
-from scipy.signal import find_peaks
 import os
-from helpers.Constants import SE, SEIZURE
+from helpers.Constants import (
+    RASTER_DENSITY_BINS,
+    RASTER_DENSITY_THRESHOLD,
+    SE,
+    SEIZURE,
+)
+from helpers.SpikeDetector import SpikeDetector, detect_channel_spikes
 from widgets.CustomViewBox import RasterViewBoxMenu
 from widgets.GroupSelectionDialog import Group
 
 
 class RasterPlot:
-    def __init__(self, data, sampling_rate, active_channels, downsample_factor):
+    def __init__(
+        self,
+        data,
+        sampling_rate,
+        active_channels,
+        downsample_factor,
+        spike_detector: SpikeDetector = None,
+    ):
         self.data = data
         self.sampling_rate = sampling_rate
         self.active_channels = active_channels
         self.downsample_factor = downsample_factor
+        self.spike_detector = spike_detector or SpikeDetector()
         self.spike_data = []
         self.plot_widget = None
         self.raster_red_line = None
@@ -25,7 +38,15 @@ class RasterPlot:
         self.groups = []
         self.show_group_colors = False
         self.legend = None
-        self.scatter_plot = None
+        self.scatter_plots: list[pg.ScatterPlotItem] = []
+        self.spike_x = np.empty(0, dtype=np.float32)
+        self.spike_y = np.empty(0, dtype=np.int32)
+        self.spike_codes = np.empty(0, dtype=np.uint8)
+        self.palette = []
+        self.row_offsets = np.zeros(1, dtype=np.int64)
+        self.max_spike_time = 0
+        self.density_item = None
+        self.density_cumsum = np.zeros(RASTER_DENSITY_BINS + 1, dtype=np.int64)
         self.tooltip = None
         self.tooltip_text = None
         self.tooltip_line_vert = None
@@ -144,21 +165,18 @@ class RasterPlot:
         self.active_channels = grouped_channels
 
     def generate_raster(self):
-        self.spike_data = [
-            self.detect_spikes(self.data[row - 1, col - 1]) / self.sampling_rate
-            for row, col in self.active_channels
-        ]
+        spikes = self.spike_detector.detect(
+            self.data,
+            self.active_channels,
+            self.spike_threshold,
+            self.sampling_rate // 10,
+        )
+        self.spike_data = [peaks / self.sampling_rate for peaks in spikes]
 
     def detect_spikes(self, channel_data):
-        voltage_data = np.asarray(channel_data["signal"]).squeeze()[
-            :: self.downsample_factor
-        ]
-        peaks, _ = find_peaks(
-            voltage_data,
-            height=self.spike_threshold,
-            distance=self.sampling_rate // 10,
+        return detect_channel_spikes(
+            channel_data["signal"], self.spike_threshold, self.sampling_rate // 10
         )
-        return peaks * self.downsample_factor
 
     def setup_tooltip(self):
         self.tooltip = pg.TextItem(
@@ -195,26 +213,39 @@ class RasterPlot:
         self.plot_widget.scene().sigMouseMoved.connect(self.update_tooltip)
 
     def find_nearest_point(self, x, y):
-        if self.scatter_plot is None or len(self.scatter_plot.data) == 0:
+        if self.spike_x.size == 0:
             return None
 
-        points = self.scatter_plot.data
-        distances = np.sqrt((points["x"] - x) ** 2 + (points["y"] - y) ** 2)
-        nearest_idx = np.argmin(distances)
-
-        if distances[nearest_idx] > 1:  # Set a maximum distance for showing tooltip
+        # Only rows within the maximum tooltip distance can hold the nearest
+        # spike; each row's times are sorted, so bisect for the neighbours
+        num_channels = len(self.active_channels)
+        nearest_idx = None
+        nearest_distance = 1.0  # Set a maximum distance for showing tooltip
+        for y_position in range(
+            max(0, int(np.ceil(y - 1))), min(num_channels - 1, int(np.floor(y + 1))) + 1
+        ):
+            channel_idx = num_channels - y_position - 1
+            start, stop = self.row_offsets[channel_idx : channel_idx + 2]
+            if start == stop:
+                continue
+            row_x = self.spike_x[start:stop]
+            insert_at = int(np.searchsorted(row_x, x))
+            for candidate in (insert_at - 1, insert_at):
+                if 0 <= candidate < row_x.size:
+                    distance = np.hypot(row_x[candidate] - x, y_position - y)
+                    if distance <= nearest_distance:
+                        nearest_distance = distance
+                        nearest_idx = start + candidate
+
+        if nearest_idx is None:
             return None
 
-        nearest_x = points["x"][nearest_idx]
-        nearest_y = points["y"][nearest_idx]
+        nearest_x = float(self.spike_x[nearest_idx])
+        nearest_y = float(self.spike_y[nearest_idx])
 
-        channel_idx = len(self.active_channels) - int(nearest_y) - 1
+        channel_idx = num_channels - int(nearest_y) - 1
         row, col = self.active_channels[channel_idx]
-        time = (
-            nearest_x
-            * max(max(times) if times.size > 0 else 0 for times in self.spike_data)
-            / len(self.active_channels)
-        )
+        time = nearest_x * self.max_spike_time / num_channels
 
         return nearest_x, nearest_y, row, col, time
 
@@ -273,8 +304,16 @@ class RasterPlot:
             axis="x", enable=False
         )
 
-        self.scatter_plot = pg.ScatterPlotItem(pxMode=True)
-        self.plot_widget.addItem(self.scatter_plot)
+        self.scatter_plots = []
+        self.density_item = pg.ImageItem(autoDownsample=True)
+        self.density_item.setZValue(-1)
+        self.density_item.hide()
+        self.plot_widget.addItem(self.density_item)
+        try:
+            view_box.sigRangeChanged.disconnect(self.update_level_of_detail)
+        except TypeError:
+            pass
+        view_box.sigRangeChanged.connect(self.update_level_of_detail)
 
         axis_label_style = {
             "color": "#000000",
@@ -318,41 +357,12 @@ class RasterPlot:
             np.max(times) if times.size > 0 else 0 for times in self.spike_data
         )
 
-        all_x = []
-        all_y = []
-        all_colors = []
-
-        for i, (spike_times, (row, col)) in enumerate(
-            zip(self.spike_data, self.active_channels)
-        ):
-            if spike_times.size == 0:
-                continue
-
-            scaled_spike_times = spike_times * num_channels / max_spike_time
-            y_position = num_channels - i - 1
-
-            all_x.extend(scaled_spike_times)
-            all_y.extend(np.full(len(spike_times), y_position))
-
-            if self.show_group_colors:
-                color = self.get_group_color(row, col)
-                all_colors.extend([color] * len(spike_times))
-            else:
-                channel_data = self.data[row - 1, col - 1]
-                colors = self.get_event_colors(channel_data, spike_times)
-                all_colors.extend(colors)
-
-        self.scatter_plot.setData(
-            x=all_x,
-            y=all_y,
-            pen=None,
-            brush=all_colors,
-            size=self.size,
-            pxMode=True,
-            symbol=self.symbol,
-        )
+        self.build_raster_columns(num_channels, max_spike_time)
+        self.draw_raster_columns()
+        self.build_density_image(num_channels)
 
         self.plot_widget.getPlotItem().getViewBox().autoRange()
+        self.update_level_of_detail()
         self.update_axes(num_channels, max_spike_time)
         self.update_legend()
 
@@ -360,24 +370,150 @@ class RasterPlot:
             y = num_channels - self.active_channels.index((row, col)) - 1
             self.plotted_channels_highlights[i].setRegion([y - 0.5, y + 0.5])
 
-    def get_event_colors(self, channel_data, spike_times):
-        colors = np.full(len(spike_times), pg.mkBrush(0, 0, 0))  # Default color (black)
+    def build_raster_columns(self, num_channels, max_spike_time):
+        """Flatten the spike trains into x/y/color-code arrays indexing self.palette."""
+        counts = [times.size for times in self.spike_data]
+        self.row_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self.max_spike_time = max_spike_time
+        if sum(counts) == 0 or max_spike_time == 0:
+            self.spike_x = np.empty(0, dtype=np.float32)
+            self.spike_y = np.empty(0, dtype=np.int32)
+            self.spike_codes = np.empty(0, dtype=np.uint8)
+            self.palette = []
+            return
+
+        times = np.concatenate(self.spike_data)
+        self.spike_x = (times * num_channels / max_spike_time).astype(np.float32)
+        self.spike_y = np.repeat(
+            np.arange(num_channels - 1, -1, -1, dtype=np.int32), counts
+        )
+
+        if self.show_group_colors:
+            self.palette = [pg.mkBrush(0, 0, 0)] + [
+                pg.mkBrush(*[int(255 * c) for c in group.color])
+                for group in self.groups
+            ]
+            channel_codes = np.array(
+                [self.get_group_code(row, col) for row, col in self.active_channels],
+                dtype=np.uint8,
+            )
+            self.spike_codes = np.repeat(channel_codes, counts)
+        else:
+            self.palette = [pg.mkBrush(0, 0, 0), pg.mkBrush(SE), pg.mkBrush(SEIZURE)]
+            self.spike_codes = np.concatenate(
+                [
+                    self.get_event_codes(self.data[row - 1, col - 1], spike_times)
+                    for spike_times, (row, col) in zip(
+                        self.spike_data, self.active_channels
+                    )
+                ]
+            )
+
+    def draw_raster_columns(self):
+        for item in self.scatter_plots:
+            self.plot_widget.removeItem(item)
+        self.scatter_plots = []
+
+        # One batched item per color class instead of a brush per spike
+        for code, brush in enumerate(self.palette):
+            mask = self.spike_codes == code
+            if not np.any(mask):
+                continue
+            item = pg.ScatterPlotItem(
+                x=self.spike_x[mask],
+                y=self.spike_y[mask],
+                pen=None,
+                brush=brush,
+                size=self.size,
+                pxMode=True,
+                symbol=self.symbol,
+            )
+            self.plot_widget.addItem(item)
+            self.scatter_plots.append(item)
+
+    def build_density_image(self, num_channels):
+        """Bin the spike columns into a channels x time RGBA image used when zoomed out."""
+        bins = RASTER_DENSITY_BINS
+        if self.spike_x.size == 0:
+            self.density_cumsum = np.zeros(bins + 1, dtype=np.int64)
+            self.density_item.clear()
+            return
+
+        bin_idx = np.clip(
+            (self.spike_x * (bins / num_channels)).astype(np.int64), 0, bins - 1
+        )
+        flat = bin_idx * num_channels + self.spike_y
+        size = bins * num_channels
+        counts = np.bincount(flat, minlength=size)
+
+        self.density_cumsum = np.concatenate(
+            ([0], np.cumsum(counts.reshape(bins, num_channels).sum(axis=1)))
+        )
+
+        # Each bin takes the mean palette color of its spikes, with the spike
+        # count mapped (log scale) to opacity over the white background
+        palette_rgb = np.array(
+            [brush.color().getRgb()[:3] for brush in self.palette], dtype=np.float64
+        )
+        filled = counts > 0
+        image = np.zeros((size, 4), dtype=np.uint8)
+        for channel in range(3):
+            color_sum = np.bincount(
+                flat, weights=palette_rgb[self.spike_codes, channel], minlength=size
+            )
+            image[filled, channel] = color_sum[filled] / counts[filled]
+        intensity = np.log1p(counts[filled]) / np.log1p(counts.max())
+        image[filled, 3] = 64 + 191 * intensity
+
+        self.density_item.setImage(
+            image.reshape(bins, num_channels, 4), autoLevels=False, levels=(0, 255)
+        )
+        self.density_item.setRect(QRectF(0, -0.5, num_channels, num_channels))
+
+    def update_level_of_detail(self, *args):
+        if self.plot_widget is None or self.density_item is None:
+            return
+
+        num_channels = len(self.active_channels)
+        view_box = self.plot_widget.getPlotItem().getViewBox()
+        (x0, x1), (y0, y1) = view_box.viewRange()
+        width, height = view_box.width(), view_box.height()
+        if num_channels == 0 or width <= 0 or height <= 0:
+            return
+
+        bins = RASTER_DENSITY_BINS
+        b0 = int(np.clip(np.floor(x0 * bins / num_channels), 0, bins))
+        b1 = int(np.clip(np.ceil(x1 * bins / num_channels), 0, bins))
+        visible_rows = np.clip(y1, -0.5, num_channels - 0.5) - np.clip(
+            y0, -0.5, num_channels - 0.5
+        )
+        visible_spikes = (self.density_cumsum[b1] - self.density_cumsum[b0]) * (
+            visible_rows / num_channels
+        )
+
+        use_density = bool(visible_spikes / (width * height) > RASTER_DENSITY_THRESHOLD)
+        self.density_item.setVisible(use_density)
+        for item in self.scatter_plots:
+            item.setVisible(not use_density)
+
+    def get_event_codes(self, channel_data, spike_times):
+        codes = np.zeros(len(spike_times), dtype=np.uint8)  # Default color (black)
 
         for start, stop, _ in channel_data["SETimes"]:
             mask = (start <= spike_times) & (spike_times <= stop)
-            colors[mask] = pg.mkBrush(SE)
+            codes[mask] = 1
 
         for start, stop, _ in channel_data["SzTimes"]:
             mask = (start <= spike_times) & (spike_times <= stop)
-            colors[mask] = pg.mkBrush(SEIZURE)
+            codes[mask] = 2
 
-        return colors
+        return codes
 
-    def get_group_color(self, row, col):
-        group = self.get_group(row, col)
-        if group:
-            return pg.mkBrush(*[int(255 * c) for c in group.color])
-        return pg.mkBrush(0, 0, 0)  # Default color for ungrouped channels
+    def get_group_code(self, row, col):
+        for i, group in enumerate(self.groups):
+            if (row, col) in group.channels:
+                return min(i + 1, 255)
+        return 0  # Default color for ungrouped channels
 
     def update_axes(self, num_channels, max_spike_time):
         ax = self.plot_widget.getAxis("bottom")
@@ -1,12 +1,13 @@
 import math
 from time import perf_counter
 from helpers.alert import alert
-import numpy as np
-import cv2
+from helpers.FrameRenderer import FrameRenderer
+from threads.VideoExportThread import VideoExportThread
 from PyQt5.QtCore import QEvent, QRectF, Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import (
     QBrush,
     QColor,
+    QImage,
     QKeyEvent,
     QMouseEvent,
     QPainter,
@@ -15,7 +16,6 @@ from PyQt5.QtGui import (
     QWheelEvent,
 )
 from PyQt5.QtWidgets import (
-    QApplication,
     QDialog,
     QFileDialog,
     QGraphicsPixmapItem,
@@ -316,6 +316,8 @@ class VideoEditor(QDialog):
         self.showMaximized()
 
         self.frame_cache = {}
+        self.renderer = None
+        self.export_thread = None
 
         self.layout = QVBoxLayout()
 
@@ -425,8 +427,7 @@ class VideoEditor(QDialog):
         self.segment_list.setCurrentRow(index)
 
     def update_preview(self, time):
-        frame = int(time * self.main_window.sampling_rate)
-        pixmap = self.render_frame(frame)
+        pixmap = self.render_frame(time)
         self.preview_item.setPixmap(pixmap)
         self.preview_scene.setSceneRect(QRectF(pixmap.rect()))
         self.preview_view.fitInView(self.preview_scene.sceneRect(), Qt.KeepAspectRatio)
@@ -450,125 +451,84 @@ class VideoEditor(QDialog):
         self.update_current_time(self.trimmer.current_pos)
         self.trimmer.update()
 
-    def render_frame(self, frame):
+    def get_renderer(self):
+        if self.renderer is None:
+            self.renderer = FrameRenderer.from_main_window(self.main_window)
+        return self.renderer
+
+    def render_frame(self, time):
+        frame = int(time * self.main_window.sampling_rate)
         if frame in self.frame_cache:
             return self.frame_cache[frame]
 
-        self.main_window.progress_bar.setValue(frame)
-        self.main_window.update_grid()
-
-        # Render the grid
-        grid_pixmap = self.main_window.grid_widget.grab()
-
-        # Render the graphs
-        graph_pixmaps = []
-        for i in range(4):
-            if self.main_window.plotted_channels[i] is not None:
-                self.main_window.graph_widget.update_red_lines(
-                    frame, self.main_window.sampling_rate
-                )
-                graph_pixmap = self.main_window.graph_widget.plot_widgets[i].grab()
-                graph_pixmaps.append(graph_pixmap)
-
-        combined_pixmap = self.combine_pixmaps(grid_pixmap, graph_pixmaps)
-
-        self.frame_cache[frame] = combined_pixmap
-        return combined_pixmap
-
-    def combine_pixmaps(self, grid_pixmap, graph_pixmaps):
-        grid_width = grid_pixmap.width()
-        grid_height = grid_pixmap.height()
-
-        graph_width = grid_width
-        total_width = grid_width * 2
-
-        combined_pixmap = QPixmap(total_width, grid_height)
-        combined_pixmap.fill(Qt.white)
-
-        painter = QPainter(combined_pixmap)
-        painter.drawPixmap(0, 0, grid_pixmap)
-
-        num_graphs = len(graph_pixmaps)
-        if num_graphs > 0:
-            graph_height = grid_height // len(graph_pixmaps)
-
-            for i, graph_pixmap in enumerate(graph_pixmaps):
-                scaled_graph = graph_pixmap.scaled(
-                    graph_width,
-                    graph_height,
-                    Qt.KeepAspectRatio,
-                    Qt.SmoothTransformation,
-                )
-                painter.drawPixmap(grid_width, i * graph_height, scaled_graph)
+        image = self.get_renderer().render(time)
+        height, width, _ = image.shape
+        pixmap = QPixmap.fromImage(
+            QImage(image.data, width, height, 3 * width, QImage.Format_RGB888)
+        )
 
-        painter.end()
-        return combined_pixmap
+        self.frame_cache[frame] = pixmap
+        return pixmap
 
     def export_video(self):
-        start_time = perf_counter()
-        fps = self.fps_spin.value()
+        if self.export_thread is not None:
+            return
 
         output_path, _ = QFileDialog.getSaveFileName(
             self, "Save Video", "output.mp4", "MP4 Files (*.mp4)"
         )
 
         if output_path:
-            sample_frame = self.render_frame(0)
-            width, height = sample_frame.width(), sample_frame.height()
-
-            # Use H.264 codec with hardware acceleration if available
-            fourcc = cv2.VideoWriter_fourcc(*"avc1")
-            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-
-            total_frames = sum(
-                int((end - start) * self.main_window.sampling_rate)
-                for start, end in self.trimmer.segments
+            self.export_start_time = perf_counter()
+            # Snapshot the current view settings so the export matches the preview
+            self.renderer = FrameRenderer.from_main_window(self.main_window)
+            self.frame_cache.clear()
+
+            self.export_thread = VideoExportThread(
+                self.renderer,
+                list(self.trimmer.segments),
+                output_path,
+                self.fps_spin.value(),
             )
-            progress_dialog = QProgressDialog(
-                "Exporting Video...", "Cancel", 0, total_frames, self
+            self.progress_dialog = QProgressDialog(
+                "Exporting Video...",
+                "Cancel",
+                0,
+                self.export_thread.total_frames(),
+                self,
             )
-            progress_dialog.setWindowModality(Qt.WindowModal)
-
-            try:
-                frames_processed = 0
-                for start, end in self.trimmer.segments:
-                    start_frame = int(start * self.main_window.sampling_rate)
-                    end_frame = int(end * self.main_window.sampling_rate)
-
-                    for frame in range(start_frame, end_frame):
-                        if progress_dialog.wasCanceled():
-                            raise Exception("Export canceled by user")
-
-                        pixmap = self.render_frame(frame)
-                        image = self.qpixmap_to_cvimg(pixmap)
-                        out.write(image)
-
-                        frames_processed += 1
-                        progress_dialog.setValue(frames_processed)
-                        QApplication.processEvents()  # Allow GUI updates
-
-            except Exception as e:
-                QMessageBox.warning(self, "Export Error", str(e))
-            finally:
-                end_time = perf_counter()
-                total_time = end_time - start_time
-                out.release()
-                progress_dialog.close()
-                alert(f"Video saved to {output_path} in {total_time:.2f} seconds.")
-
-            if not progress_dialog.wasCanceled():
-                QMessageBox.information(
-                    self, "Video Created", f"Video saved to {output_path}"
-                )
+            self.progress_dialog.setWindowModality(Qt.WindowModal)
+            self.progress_dialog.canceled.connect(
+                self.export_thread.requestInterruption
+            )
+            self.export_thread.progress.connect(self.progress_dialog.setValue)
+            self.export_thread.export_finished.connect(self.on_export_finished)
+            self.export_button.setEnabled(False)
+            self.progress_dialog.show()
+            self.export_thread.start()
+
+    def on_export_finished(self, completed, output_path, error):
+        total_time = perf_counter() - self.export_start_time
+        self.export_thread.wait()
+        self.export_thread = None
+        self.progress_dialog.close()
+        self.export_button.setEnabled(True)
+
+        if completed:
+            alert(f"Video saved to {output_path} in {total_time:.2f} seconds.")
+            QMessageBox.information(
+                self, "Video Created", f"Video saved to {output_path}"
+            )
+        elif error:
+            QMessageBox.warning(self, "Export Error", error)
+        else:
+            QMessageBox.warning(self, "Export Error", "Export canceled")
 
-    def qpixmap_to_cvimg(self, pixmap):
-        qimage = pixmap.toImage()
-        width = qimage.width()
-        height = qimage.height()
-        ptr = qimage.constBits()
-        ptr.setsize(height * width * 4)
-        arr = np.frombuffer(ptr, np.uint8).reshape((height, width, 4))
-        return cv2.cvtColor(arr, cv2.COLOR_BGRA2BGR)
+    def reject(self):
+        if self.export_thread is not None:
+            self.export_thread.requestInterruption()
+            self.export_thread.wait()
+        super().reject()
 
     def eventFilter(self, obj, event):
         if event.type() == QEvent.KeyPress: